@@ -1,117 +1,216 @@
 import pandas as pd
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import numpy as np
 from collections import Counter
-from datetime import datetime, timedelta
 import os
 import json
+import orjson
+import hashlib
 from dotenv import load_dotenv
 import zhipuai
+import httpx
+import weakref
 import re
-import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# 可能的敏感词，发送给 API 前统一替换
+SENSITIVE_WORDS = ['自杀', '暴力', '色情', '赌博']
+_SENSITIVE_RE = re.compile('|'.join(map(re.escape, SENSITIVE_WORDS)))
+
+# 请求智谱 AI 时使用的固定提示词
+_SYSTEM_MSG = {"role": "system", "content": """你是一个专业的对话分析师。请严格按照以下要求回复：
+1. 只返回JSON格式的内容，不要添加任何其他文字
+2. 使用客观、中性的语言
+3. 避免任何敏感或不当的表述
+4. 如果内容不合适，返回默认的中性分析结果"""}
+
+_USER_TMPL = """分析以下对话：
+
+{conv}
+
+请严格按照以下JSON格式回复：
+{{
+    "topic": "对话主题",
+    "is_new_topic": true或false,
+    "new_topic_reason": "判断理由",
+    "importance": 分数(1-10),
+    "attitudes": "双方态度的客观描述",
+    "depth": 分数(1-10)
+}}"""
+
+_BATCH_USER_TMPL = """分析以下 {n} 组对话，每组独立分析：
+
+{sections}
+
+请严格按照以下JSON格式回复，results 中按组的顺序依次给出每组的分析，共 {n} 项：
+{{
+    "results": [
+        {{
+            "topic": "对话主题",
+            "is_new_topic": true或false,
+            "new_topic_reason": "判断理由",
+            "importance": 分数(1-10),
+            "attitudes": "双方态度的客观描述",
+            "depth": 分数(1-10)
+        }}
+    ]
+}}"""
+
+# 紧跟另一个逗号或右括号的逗号是多余的
+_EXTRA_COMMA_RE = re.compile(r',(?=\s*[,}\]])')
+_JSON_DECODER = json.JSONDecoder()
+
+def _orjson_default(obj):
+    """orjson 不直接支持 pandas.Timestamp，保存为秒级 Unix 时间戳"""
+    if isinstance(obj, pd.Timestamp):
+        return obj.value // 10**9
+    raise TypeError
 
 class ConversationAnalyzer:
-    def __init__(self, user_name: str):
+    def __init__(self, user_name: str, max_concurrency: int = 32, batch_size: int = 4,
+                 request_timeout: float = 30.0):
         self.user_name = user_name
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size  # 每次请求合并分析的对话组数量
         load_dotenv()
-        self.client = zhipuai.ZhipuAI(api_key=os.getenv("ZHIPUAI_API_KEY"))  # 创建 ZhipuAI 实例
+        # 单次请求的读取超时，批量请求的回复较长，不宜过短；进行中的请求无法取消，中断后最多等待这么久
+        timeout = httpx.Timeout(request_timeout, connect=5.0)
+        # 连接池与并发数保持一致，避免请求在池中排队或频繁重建连接
+        self._http_client = httpx.Client(timeout=timeout, limits=httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=max_concurrency
+        ))
+        weakref.finalize(self, self._http_client.close)
+        # 重试由 _request_json_async 负责，SDK 内部不再重试，避免单个请求长时间占用工作线程
+        self.client = zhipuai.ZhipuAI(api_key=os.getenv("ZHIPUAI_API_KEY"), http_client=self._http_client,
+                                      timeout=timeout, max_retries=0)  # 创建 ZhipuAI 实例
+        # SDK 只提供同步客户端，阻塞请求放到线程池中执行，由事件循环并发调度
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='zhipu')
+        weakref.finalize(self, self._executor.shutdown, wait=False, cancel_futures=True)
+        # 以对话内容哈希为键缓存分析结果，重复运行时相同对话不再请求 API
+        self._cache = self._load_cache()
         
     def group_messages_by_time(self, df: pd.DataFrame, time_threshold: int = 1800) -> List[List[Dict]]:
         """根据时间间隔将消息分组"""
-        groups = []
-        current_group = []
+        if df.empty:
+            return []
         
-        for _, row in df.iterrows():
-            if not current_group:
-                current_group.append(row.to_dict())
-            else:
-                time_diff = (row['timestamp'] - current_group[-1]['timestamp']).total_seconds()
-                if time_diff <= time_threshold:
-                    current_group.append(row.to_dict())
-                else:
-                    groups.append(current_group)
-                    current_group = [row.to_dict()]
-                    
-        if current_group:
-            groups.append(current_group)
-            
-        return groups
+        # 相邻消息间隔超过阈值的位置即为新分组的起点
+        gaps = df['timestamp'].diff().dt.total_seconds().to_numpy()
+        boundaries = [0, *np.flatnonzero(gaps > time_threshold).tolist(), len(df)]
+        
+        records = df.to_dict('records')
+        return [records[start:end] for start, end in zip(boundaries[:-1], boundaries[1:])]
     
-    def _clean_json_string(self, json_str: str) -> str:
-        """清理和修复 JSON 字符串"""
-        # 查找第一个 { 和最后一个 } 之间的内容
+    def _parse_json_string(self, json_str: str) -> Dict:
+        """从响应中解析第一个完整的 JSON 对象，顺带移除多余的逗号"""
         start = json_str.find('{')
-        end = json_str.rfind('}') + 1
-        if start == -1 or end == 0:
-            # 尝试查找 JSON 代码块
-            if '```json' in json_str:
-                json_block = json_str.split('```json')[-1].split('```')[0].strip()
-                start = json_block.find('{')
-                end = json_block.rfind('}') + 1
-                if start != -1 and end != 0:
-                    json_str = json_block[start:end]
-            else:
-                raise ValueError("No JSON content found")
-        else:
-            json_str = json_str[start:end]
-        
-        # 处理嵌套的大括号
-        if json_str.count('{') > 1:
-            # 找到最内层的大括号
-            inner_start = json_str.rfind('{')
-            inner_end = json_str.find('}', inner_start) + 1
-            if inner_start != -1 and inner_end != 0:
-                json_str = json_str[inner_start:inner_end]
+        if start == -1:
+            raise ValueError("No JSON content found")
         
-        # 移除多余的逗号
-        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
-        json_str = re.sub(r',(\s*,)', ',', json_str)
-        
-        return json_str
+        # raw_decode 只解析第一个完整对象，忽略其后的代码块结尾等多余内容
+        analysis, _ = _JSON_DECODER.raw_decode(_EXTRA_COMMA_RE.sub('', json_str[start:]))
+        return analysis
     
     def _filter_sensitive_content(self, text: str) -> str:
         """过滤可能的敏感内容"""
-        # 替换可能的敏感词
-        sensitive_words = ['自杀', '暴力', '色情', '赌博']
-        filtered_text = text
-        for word in sensitive_words:
-            filtered_text = filtered_text.replace(word, '**')
-        return filtered_text
+        # 单次扫描替换所有敏感词
+        return _SENSITIVE_RE.sub('**', text)
     
-    def analyze_topic_with_zhipu(self, messages: List[Dict], max_retries: int = 3, retry_delay: int = 5) -> Dict:
-        """使用智谱 AI 分析对话主题和重要性"""
-        # 构建对话文本并过滤敏感内容
-        conversation_text = "\n".join([
+    async def _request_zhipu(self, sem: Optional[asyncio.Semaphore], **kwargs):
+        """在线程池中发起一次智谱 AI 请求，sem 用于限制同时进行的请求数"""
+        loop = asyncio.get_running_loop()
+        call = partial(self.client.chat.completions.create, **kwargs)
+        if sem is None:
+            return await loop.run_in_executor(self._executor, call)
+        async with sem:
+            return await loop.run_in_executor(self._executor, call)
+    
+    def _format_conversation(self, messages: List[Dict]) -> str:
+        """构建对话文本并过滤敏感内容"""
+        return "\n".join([
             f"{msg['sender']} ({msg['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}): {self._filter_sensitive_content(msg['content'])}"
             for msg in messages
         ])
-        
+    
+    def _cache_key(self, conversation_text: str) -> str:
+        """计算对话文本的缓存键"""
+        return hashlib.blake2b(conversation_text.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _load_cache(self, filename: str = 'llm_cache.jsonl') -> Dict[str, Dict]:
+        """加载已缓存的分析结果"""
+        cache = {}
+        try:
+            filepath = os.path.join('analysis_results', filename)
+            if not os.path.exists(filepath):
+                return cache
+            
+            with open(filepath, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    cache[entry['key']] = entry['analysis']
+        except Exception as e:
+            print(f"加载分析缓存时出错: {str(e)}")
+        return cache
+    
+    def _store_cache(self, key: str, analysis: Dict, filename: str = 'llm_cache.jsonl'):
+        """缓存一条分析结果并追加到缓存文件"""
+        self._cache[key] = analysis
+        try:
+            output_dir = 'analysis_results'
+            os.makedirs(output_dir, exist_ok=True)
+            with open(os.path.join(output_dir, filename), 'ab') as f:
+                f.write(orjson.dumps({'key': key, 'analysis': analysis}) + b'\n')
+        except Exception as e:
+            print(f"\n警告：保存分析缓存时出错: {str(e)}")
+    
+    def _normalize_analysis(self, analysis: Dict) -> Dict:
+        """验证和规范化分析结果"""
+        return {
+            'topic': str(analysis.get('topic', '未知')),
+            'is_new_topic': bool(analysis.get('is_new_topic', False)),
+            'new_topic_reason': str(analysis.get('new_topic_reason', '无')),
+            'importance': min(max(int(analysis.get('importance', 5)), 1), 10),
+            'attitudes': str(analysis.get('attitudes', '中性')),
+            'depth': min(max(int(analysis.get('depth', 5)), 1), 10)
+        }
+    
+    def _retry_wait(self, error: Exception, attempt: int, retry_delay: float) -> Optional[float]:
+        """计算重试前的等待秒数，返回 None 表示该错误不应重试"""
+        status_code = error.status_code if isinstance(error, zhipuai.APIStatusError) else None
+        if status_code == 429:
+            # 触发限流时优先遵循服务端给出的 Retry-After，但最多等待 60 秒；无效值改用指数退避
+            try:
+                retry_after = float(error.response.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                retry_after = None
+            if retry_after is not None and retry_after >= 0:
+                return min(retry_after, 60)
+        elif status_code is not None and 400 <= status_code < 500:
+            # 其他 4xx 错误重试也无法成功，直接失败
+            return None
+        # 指数退避并加入随机抖动，避免并发请求同时重试
+        return min(30, retry_delay * 2 ** attempt + random.random())
+    
+    async def _request_json_async(self, user_content: str, sem: Optional[asyncio.Semaphore] = None,
+                                  max_retries: int = 3, retry_delay: int = 5) -> Dict:
+        """请求智谱 AI 并解析返回的 JSON，失败时重试，重试耗尽后抛出最后一次的异常"""
         for attempt in range(max_retries):
             try:
-                response = self.client.chat.completions.create(
+                response = await self._request_zhipu(
+                    sem,
                     model="chatglm_turbo",
                     messages=[
-                        {"role": "system", "content": """你是一个专业的对话分析师。请严格按照以下要求回复：
-1. 只返回JSON格式的内容，不要添加任何其他文字
-2. 使用客观、中性的语言
-3. 避免任何敏感或不当的表述
-4. 如果内容不合适，返回默认的中性分析结果"""},
-                        {"role": "user", "content": f"""分析以下对话：
-
-{conversation_text}
-
-请严格按照以下JSON格式回复：
-{{
-    "topic": "对话主题",
-    "is_new_topic": true或false,
-    "new_topic_reason": "判断理由",
-    "importance": 分数(1-10),
-    "attitudes": "双方态度的客观描述",
-    "depth": 分数(1-10)
-}}"""}
+                        _SYSTEM_MSG,
+                        {"role": "user", "content": user_content}
                     ],
-                    temperature=0.7,
-                    timeout=30
+                    temperature=0.7
                 )
                 
                 # 解析响应
@@ -122,61 +221,155 @@ class ConversationAnalyzer:
                     raise ValueError("API returned invalid response (exclamation marks)")
                 
                 try:
-                    # 清理和修复 JSON 字符串
-                    cleaned_content = self._clean_json_string(content)
-                    
-                    try:
-                        analysis = json.loads(cleaned_content)
-                    except json.JSONDecodeError as je:
-                        print(f"JSON解析错误: {je}")
-                        print(f"清理后的响应: {cleaned_content}")
-                        raise
-                    
-                    # 验证和规范化结果
-                    analysis = {
-                        'topic': str(analysis.get('topic', '未知')),
-                        'is_new_topic': bool(analysis.get('is_new_topic', False)),
-                        'new_topic_reason': str(analysis.get('new_topic_reason', '无')),
-                        'importance': min(max(int(analysis.get('importance', 5)), 1), 10),
-                        'attitudes': str(analysis.get('attitudes', '中性')),
-                        'depth': min(max(int(analysis.get('depth', 5)), 1), 10)
-                    }
-                    
-                    return {
-                        'messages': messages,
-                        'analysis': analysis
-                    }
+                    return self._parse_json_string(content)
                 except Exception as e:
                     print(f"处理响应时出错: {str(e)}")
                     print(f"原始响应: {content}")
-                    if attempt < max_retries - 1:
-                        print(f"等待 {retry_delay} 秒后重试...")
-                        time.sleep(retry_delay)
-                        continue
                     raise
                     
             except Exception as e:
-                if attempt < max_retries - 1:
-                    print(f"第 {attempt + 1} 次尝试失败: {str(e)}")
-                    print(f"等待 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    print(f"智谱 AI 分析出错: {str(e)}")
-                    if len(messages) > 0:
-                        print(f"消息数量: {len(messages)}")
-                        print(f"第一条消息: {messages[0]['content'][:100]}...")
-                    return {
-                        'messages': messages,
-                        'analysis': {
-                            'topic': '未知',
-                            'is_new_topic': False,
-                            'new_topic_reason': f'分析失败: {str(e)}',
-                            'importance': 5,
-                            'attitudes': '中性',
-                            'depth': 5
-                        }
-                    }
+                wait = self._retry_wait(e, attempt, retry_delay) if attempt < max_retries - 1 else None
+                if wait is None:
+                    raise
+                print(f"第 {attempt + 1} 次尝试失败: {str(e)}")
+                print(f"等待 {wait:.1f} 秒后重试...")
+                await asyncio.sleep(wait)
+    
+    def _is_trivial_group(self, messages: List[Dict]) -> bool:
+        """判断对话组是否过短，不值得调用 API 分析"""
+        return len(messages) <= 1 or sum(len(msg['content']) for msg in messages) < 20
+    
+    def _heuristic_analysis(self, messages: List[Dict], previous_group: Optional[List[Dict]] = None) -> Dict:
+        """不调用 API，为过短的对话组生成默认分析结果，按与上一组的时间间隔判断是否为新话题"""
+        if previous_group:
+            gap = (messages[0]['timestamp'] - previous_group[-1]['timestamp']).total_seconds()
+            is_new_topic = gap > 7200
+            reason = f"对话过短，距上一组对话 {gap / 3600:.1f} 小时"
+        else:
+            is_new_topic = True
+            reason = "对话过短，且为第一组对话"
+        
+        return {
+            'topic': '未知',
+            'is_new_topic': is_new_topic,
+            'new_topic_reason': reason,
+            'importance': 5,
+            'attitudes': '中性',
+            'depth': 5
+        }
+    
+    def analyze_topic_with_zhipu(self, messages: List[Dict], max_retries: int = 3, retry_delay: int = 5,
+                                 previous_group: Optional[List[Dict]] = None) -> Dict:
+        """使用智谱 AI 分析对话主题和重要性"""
+        return asyncio.run(self._analyze_topic_async(messages, None, max_retries, retry_delay, previous_group))
+    
+    async def _analyze_topic_async(self, messages: List[Dict], sem: Optional[asyncio.Semaphore] = None,
+                                   max_retries: int = 3, retry_delay: int = 5,
+                                   previous_group: Optional[List[Dict]] = None) -> Dict:
+        """analyze_topic_with_zhipu 的异步实现"""
+        # 过短的对话组直接返回默认结果，不调用 API
+        if self._is_trivial_group(messages):
+            return {
+                'messages': messages,
+                'analysis': self._heuristic_analysis(messages, previous_group)
+            }
+        
+        conversation_text = self._format_conversation(messages)
+        cache_key = self._cache_key(conversation_text)
+        if cache_key in self._cache:
+            return {
+                'messages': messages,
+                'analysis': dict(self._cache[cache_key])
+            }
+        
+        try:
+            analysis = await self._request_json_async(
+                _USER_TMPL.format(conv=conversation_text), sem, max_retries, retry_delay
+            )
+            
+            analysis = self._normalize_analysis(analysis)
+            self._store_cache(cache_key, analysis)
+            return {
+                'messages': messages,
+                'analysis': analysis
+            }
+        except Exception as e:
+            print(f"智谱 AI 分析出错: {str(e)}")
+            if len(messages) > 0:
+                print(f"消息数量: {len(messages)}")
+                print(f"第一条消息: {messages[0]['content'][:100]}...")
+            return {
+                'messages': messages,
+                'analysis': {
+                    'topic': '未知',
+                    'is_new_topic': False,
+                    'new_topic_reason': f'分析失败: {str(e)}',
+                    'importance': 5,
+                    'attitudes': '中性',
+                    'depth': 5
+                }
+            }
+    
+    def analyze_topics_batch(self, groups: List[List[Dict]], max_retries: int = 3, retry_delay: int = 5,
+                             previous_group: Optional[List[Dict]] = None) -> List[Dict]:
+        """在一次请求中分析多组对话，返回与 groups 顺序一致的结果"""
+        return asyncio.run(self._analyze_batch_async(groups, None, max_retries, retry_delay, previous_group))
+    
+    async def _analyze_batch_async(self, groups: List[List[Dict]], sem: Optional[asyncio.Semaphore] = None,
+                                   max_retries: int = 3, retry_delay: int = 5,
+                                   previous_group: Optional[List[Dict]] = None) -> List[Dict]:
+        """analyze_topics_batch 的异步实现，过短或已缓存的组直接返回，批量分析失败时退回逐组分析"""
+        texts, keys, results = {}, {}, []
+        for i, group in enumerate(groups):
+            if self._is_trivial_group(group):
+                results.append({
+                    'messages': group,
+                    'analysis': self._heuristic_analysis(group, groups[i - 1] if i > 0 else previous_group)
+                })
+                continue
+            
+            texts[i] = self._format_conversation(group)
+            keys[i] = self._cache_key(texts[i])
+            results.append({
+                'messages': group,
+                'analysis': dict(self._cache[keys[i]])
+            } if keys[i] in self._cache else None)
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        if len(pending) == 1:
+            results[pending[0]] = await self._analyze_topic_async(groups[pending[0]], sem, max_retries, retry_delay)
+        if len(pending) <= 1:
+            return results
+        
+        sections = "\n\n".join(
+            f"### 第{n}组\n{texts[i]}" for n, i in enumerate(pending, 1)
+        )
+        
+        try:
+            data = await self._request_json_async(
+                _BATCH_USER_TMPL.format(n=len(pending), sections=sections), sem, max_retries, retry_delay
+            )
+            
+            batch_results = data.get('results') if isinstance(data, dict) else None
+            if not isinstance(batch_results, list) or len(batch_results) != len(pending):
+                raise ValueError(f"批量分析返回的结果数量不匹配: 期望 {len(pending)} 项")
+            
+            analyses = [self._normalize_analysis(analysis) for analysis in batch_results]
+            for i, analysis in zip(pending, analyses):
+                self._store_cache(keys[i], analysis)
+                results[i] = {
+                    'messages': groups[i],
+                    'analysis': analysis
+                }
+        except Exception as e:
+            print(f"批量分析失败，改为逐组分析: {str(e)}")
+            analyzed = await asyncio.gather(*[
+                self._analyze_topic_async(groups[i], sem, max_retries, retry_delay) for i in pending
+            ])
+            for i, result in zip(pending, analyzed):
+                results[i] = result
+        
+        return results
     
     def analyze_conversation(self, df: pd.DataFrame) -> Dict:
         """分析整个对话"""
@@ -193,26 +386,16 @@ class ConversationAnalyzer:
         if start_index > 0:
             print(f"找到之前的分析结果，从第 {start_index + 1} 组继续分析...")
         
-        # 分析每个对话组
-        for i, group in enumerate(message_groups[start_index:], start_index + 1):
-            print(f"\r正在分析第 {i}/{total_groups} 组对话... ({(i/total_groups*100):.1f}%)", end="", flush=True)
+        # 并发分析剩余的对话组，每完成一组即追加到中间结果文件
+        with self._open_intermediate_results() as checkpoint:
             try:
-                analysis = self.analyze_topic_with_zhipu(group)
-                analyzed_groups.append(analysis)
-                
-                # 每处理10组或处理完成时保存一次中间结果
-                if i % 10 == 0 or i == total_groups:
-                    print(f"\n已完成 {i} 组对话的分析，正在保存中间结果...")
-                    self._save_intermediate_results(analyzed_groups)
+                asyncio.run(self._analyze_groups_async(message_groups, analyzed_groups, start_index, checkpoint))
             except KeyboardInterrupt:
-                print("\n\n检测到中断信号，正在保存当前进度...")
-                self._save_intermediate_results(analyzed_groups)
-                print(f"已保存到第 {i} 组对话，下次运行时将从此处继续。")
+                # 丢弃尚未开始的请求，不等待进行中的请求结束
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                print("\n\n检测到中断信号，当前进度已保存。")
+                print(f"已保存到第 {len(analyzed_groups)} 组对话，下次运行时将从此处继续。")
                 raise
-            except Exception as e:
-                print(f"\n处理第 {i} 组对话时出错: {str(e)}")
-                print("继续处理下一组...")
-                continue
         
         print("\n对话分析完成，正在计算统计数据...")
         
@@ -224,74 +407,113 @@ class ConversationAnalyzer:
                          if g['analysis']['is_new_topic'] and g['messages'][0]['sender'] != self.user_name)
         }
         
-        # 计算平均回复时间
-        response_times = df.groupby('sender')['response_time'].mean()
+        # 计算平均回复时间：一次分组得到双方均值，对方取所有非用户消息的均值
+        is_user = df['sender'] == self.user_name
+        response_times = df.groupby(is_user, sort=False)['response_time'].mean()
         
         return {
             'analyzed_groups': analyzed_groups,
             'topic_initiation': topic_initiations,
             'response_patterns': {
-                'user_avg_response_time': response_times.get(self.user_name, 0),
-                'partner_avg_response_time': response_times.mean() - response_times.get(self.user_name, 0)
+                'user_avg_response_time': response_times.get(True, 0),
+                'partner_avg_response_time': response_times.get(False, 0)
             }
         }
     
-    def _load_intermediate_results(self) -> List[Dict]:
+    async def _analyze_groups_async(self, message_groups: List[List[Dict]], analyzed_groups: List[Dict],
+                                    start_index: int, checkpoint):
+        """分批并发分析对话组，结果按原始顺序追加到 analyzed_groups 和中间结果文件"""
+        total_groups = len(message_groups)
+        sem = asyncio.Semaphore(self.max_concurrency)
+        
+        async def analyze(index: int, batch: List[List[Dict]]):
+            try:
+                previous_group = message_groups[index - 1] if index > 0 else None
+                return index, await self._analyze_batch_async(batch, sem, previous_group=previous_group)
+            except Exception as e:
+                print(f"\n处理第 {index + 1}-{index + len(batch)} 组对话时出错: {str(e)}")
+                print("继续处理下一组...")
+                return index, [None] * len(batch)
+        
+        # 按分组顺序创建任务，使信号量也按顺序获取，先完成的批次尽量是靠前的批次，中间结果可以及时写入
+        tasks = [asyncio.create_task(analyze(i, message_groups[i:i + self.batch_size]))
+                 for i in range(start_index, total_groups, self.batch_size)]
+        finished = {}
+        next_index = start_index
+        completed = start_index
+        for future in asyncio.as_completed(tasks):
+            index, results = await future
+            for offset, result in enumerate(results):
+                finished[index + offset] = result
+            completed += len(results)
+            # 完成顺序是乱序的，只追加已连续完成的部分，保证断点续传时的起始位置正确
+            while next_index in finished:
+                result = finished.pop(next_index)
+                if result is not None:
+                    analyzed_groups.append(result)
+                    self._append_intermediate_result(checkpoint, result)
+                next_index += 1
+            
+            print(f"\r已完成第 {completed}/{total_groups} 组对话的分析... ({(completed/total_groups*100):.1f}%)", end="", flush=True)
+    
+    def _load_intermediate_results(self, filename: str = 'intermediate_results.jsonl') -> List[Dict]:
         """加载中间分析结果"""
         try:
-            filepath = os.path.join('analysis_results', 'intermediate_results.json')
+            filepath = os.path.join('analysis_results', filename)
             if not os.path.exists(filepath):
                 return []
             
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            # 将字符串时间戳转换回 Timestamp 对象
-            analyzed_groups = []
-            for group in data['analyzed_groups']:
-                messages = []
-                for msg in group['messages']:
-                    msg_copy = msg.copy()
-                    msg_copy['timestamp'] = pd.Timestamp(msg['timestamp'])
-                    messages.append(msg_copy)
-                
-                analyzed_groups.append({
-                    'messages': messages,
-                    'analysis': group['analysis']
-                })
+            groups = []
+            with open(filepath, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # 没有换行符的末行是中断时写了一半的记录，重新打开时会被截断
+                        break
+                    try:
+                        groups.append(orjson.loads(line))
+                    except orjson.JSONDecodeError:
+                        continue
+            
+            # 一次性把所有消息的 Unix 时间戳转换回 Timestamp 对象
+            timestamps = iter(pd.to_datetime(np.fromiter(
+                (msg['timestamp'] for group in groups for msg in group['messages']), dtype=np.int64
+            ), unit='s'))
+            analyzed_groups = [{
+                'messages': [{**msg, 'timestamp': next(timestamps)} for msg in group['messages']],
+                'analysis': group['analysis']
+            } for group in groups]
                 
             return analyzed_groups
         except Exception as e:
             print(f"加载中间结果时出错: {str(e)}")
             return []
     
-    def _save_intermediate_results(self, analyzed_groups: List[Dict], filename: str = 'intermediate_results.json'):
-        """保存中间分析结果"""
+    def _open_intermediate_results(self, filename: str = 'intermediate_results.jsonl'):
+        """以追加模式打开中间结果文件，每行保存一组分析结果"""
+        output_dir = 'analysis_results'
+        os.makedirs(output_dir, exist_ok=True)
+        f = open(os.path.join(output_dir, filename), 'a+b')
+        # 中断时可能留下写了一半的末行，截断到最后一个换行符，避免新记录与其粘连
+        size = end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            pos = f.read(end - start).rfind(b'\n')
+            if pos != -1:
+                end = start + pos + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+        return f
+    
+    def _append_intermediate_result(self, checkpoint, group: Dict):
+        """追加一组分析结果到中间结果文件"""
         try:
-            output_dir = 'analysis_results'
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            
-            # 转换 Timestamp 为字符串
-            serializable_groups = []
-            for group in analyzed_groups:
-                serializable_group = {
-                    'messages': [{
-                        'sender': msg['sender'],
-                        'content': msg['content'],
-                        'timestamp': msg['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                        'is_user': msg['is_user']
-                    } for msg in group['messages']],
-                    'analysis': group['analysis']
-                }
-                serializable_groups.append(serializable_group)
-            
-            filepath = os.path.join(output_dir, filename)
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'analyzed_groups': serializable_groups,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }, f, ensure_ascii=False, indent=2)
+            checkpoint.write(orjson.dumps(
+                group, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            ) + b'\n')
+            checkpoint.flush()
         except Exception as e:
             print(f"\n警告：保存中间结果时出错: {str(e)}")
     
@@ -302,13 +524,22 @@ class ConversationAnalyzer:
     
     def calculate_engagement_metrics(self, df: pd.DataFrame) -> Dict:
         """计算参与度指标"""
-        # 计算每日消息数量
-        daily_messages = df.groupby([df['timestamp'].dt.date, 'sender']).size().unstack()
+        # 一次性截断出日期和小时，避免 dt.date 逐个构造 Python date 对象
+        hours = df['timestamp'].to_numpy().astype('datetime64[h]')
+        days = hours.astype('datetime64[D]')
+        hour_of_day = hours.astype('int64') % 24
         
-        # 计算活跃时间段
-        hourly_messages = df.groupby([df['timestamp'].dt.hour, 'sender']).size().unstack()
+        senders = df['sender'].to_numpy()
         
         return {
-            'daily_messages': daily_messages.to_dict(),
-            'hourly_messages': hourly_messages.to_dict()
-        } 
\ No newline at end of file
+            # 计算每日消息数量
+            'daily_messages': self._count_by_sender(days, senders),
+            # 计算活跃时间段
+            'hourly_messages': self._count_by_sender(hour_of_day, senders)
+        }
+    
+    def _count_by_sender(self, keys: np.ndarray, senders: np.ndarray) -> Dict:
+        """按发送者统计每个键的消息数量，返回 {发送者: {键: 数量}}"""
+        counts = pd.crosstab(keys, senders)
+        index = counts.index.tolist()
+        return {sender: dict(zip(index, counts[sender].tolist())) for sender in counts.columns} 
\ No newline at end of file
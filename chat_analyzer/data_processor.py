@@ -1,8 +1,13 @@
 import re
-from datetime import datetime
+import os
+import mmap
 import pandas as pd
 from typing import List, Dict, Tuple
 
+# 消息头：行首的时间戳 + 发送者，两个消息头之间的内容即为消息正文；
+# 文件开头可能带 UTF-8 BOM，否则第一条消息的 ^ 无法匹配
+_MSG_RE = re.compile(rb'^(?:\xef\xbb\xbf)?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+([^\n]+)\n', re.MULTILINE)
+
 class ChatDataProcessor:
     def __init__(self, file_path: str, user_name: str):
         self.file_path = file_path
@@ -11,55 +16,48 @@ class ChatDataProcessor:
         
     def parse_chat_file(self) -> pd.DataFrame:
         """解析聊天记录文件，返回结构化的DataFrame"""
-        with open(self.file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # 使用正则表达式匹配消息
-        pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+([^\n]+)\n(.*?)(?=\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}|$)'
-        matches = re.findall(pattern, content, re.DOTALL)
-        
-        messages = []
-        for match in matches:
-            timestamp, sender, content = match
-            timestamp = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-            messages.append({
-                'timestamp': timestamp,
-                'sender': sender.strip(),
-                'content': content.strip(),
-                'is_user': sender.strip() == self.user_name
-            })
+        timestamps, senders, contents = [], [], []
+        with open(self.file_path, 'rb') as f:
+            # 通过 mmap 直接在页缓存上匹配，避免把整个文件读入内存；空文件无法映射
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                    # 逐个匹配消息头，按相邻消息头的位置切出消息正文，只解码用到的片段
+                    prev = None
+                    for match in _MSG_RE.finditer(content):
+                        if prev is not None:
+                            contents.append(content[prev.end():match.start()].decode('utf-8').strip())
+                        timestamps.append(match.group(1).decode('ascii'))
+                        senders.append(match.group(2).decode('utf-8').strip())
+                        prev = match
+                    if prev is not None:
+                        contents.append(content[prev.end():].decode('utf-8').strip())
             
-        return pd.DataFrame(messages)
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamps, format='%Y-%m-%d %H:%M:%S'),
+            'sender': senders,
+            'content': contents
+        })
+        df['is_user'] = df['sender'].eq(self.user_name)
+        return df
     
     def calculate_response_time(self, df: pd.DataFrame) -> pd.DataFrame:
         """计算每条消息的回复时间"""
         df = df.sort_values('timestamp')
-        df['response_time'] = df['timestamp'].diff()
-        df['response_time'] = df['response_time'].apply(lambda x: x.total_seconds() if pd.notnull(x) else None)
+        df['response_time'] = df['timestamp'].diff().dt.total_seconds()
+        # 消息长度只算一次，供绘图等复用
+        df['content_length'] = df['content'].map(len)
         return df
     
     def get_conversation_pairs(self, df: pd.DataFrame) -> List[Dict]:
         """将对话组织成对话对的形式"""
-        pairs = []
-        current_pair = None
-        
-        for _, row in df.iterrows():
-            if current_pair is None:
-                current_pair = {
-                    'first_sender': row['sender'],
-                    'first_message': row['content'],
-                    'first_timestamp': row['timestamp'],
-                    'response_time': None,
-                    'second_sender': None,
-                    'second_message': None,
-                    'second_timestamp': None
-                }
-            else:
-                current_pair['second_sender'] = row['sender']
-                current_pair['second_message'] = row['content']
-                current_pair['second_timestamp'] = row['timestamp']
-                current_pair['response_time'] = (row['timestamp'] - current_pair['first_timestamp']).total_seconds()
-                pairs.append(current_pair)
-                current_pair = None
-                
-        return pairs 
\ No newline at end of file
+        # 相邻两条消息组成一个对话对，末尾落单的消息不计入
+        records = df[['sender', 'content', 'timestamp']].to_dict('records')
+        return [{
+            'first_sender': first['sender'],
+            'first_message': first['content'],
+            'first_timestamp': first['timestamp'],
+            'response_time': (second['timestamp'] - first['timestamp']).total_seconds(),
+            'second_sender': second['sender'],
+            'second_message': second['content'],
+            'second_timestamp': second['timestamp']
+        } for first, second in zip(records[0::2], records[1::2])]
\ No newline at end of file
@@ -1,8 +1,174 @@
-import json
 import re
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import os
+import ahocorasick
+import orjson
+import numpy as np
+
+# 态度分析使用的情感词汇
+POSITIVE_WORDS = ['喜欢', '爱', '开心', '高兴', '幸福', '好', '棒', '美', '赞', '可爱']
+NEGATIVE_WORDS = ['讨厌', '生气', '难过', '伤心', '不好', '烦', '累', '困', '忙', '烦']
+NEUTRAL_WORDS = ['嗯', '哦', '好', '行', '可以', '知道', '明白', '了解']
+# 情感强度使用的情感词汇
+EMOTIONAL_WORDS = ['喜欢', '爱', '开心', '难过', '生气']
+# 情感倾向使用的情感词汇
+SENTIMENT_POSITIVE_WORDS = ['喜欢', '爱', '开心', '高兴', '幸福', '好']
+SENTIMENT_NEGATIVE_WORDS = ['讨厌', '生气', '难过', '伤心', '不好', '烦']
+# 话题多样性使用的话题关键词
+TOPIC_KEYWORDS = {
+    'entertainment': ['电影', '电视剧', '书', '新闻'],
+    'work': ['工作', '学习', '项目'],
+    'life': ['吃', '玩', '旅行'],
+    'relationship': ['爱', '喜欢', '想']
+}
+# 标志性话题使用的关键词
+TERMS_OF_ENDEARMENT = ['宝贝', '宝宝', '亲爱的', '老公', '老婆', '亲爱的']
+INTIMATE_KEYWORDS = ['性', '爱', '亲密', '身体', '关系']
+# 消息风格分析使用的表情符号与标点符号
+EMOJI_PATTERNS = {
+    'happy': ['😊', '😄', '😂', '😍', '😘'],
+    'sad': ['😢', '😭', '😔', '😞'],
+    'angry': ['😠', '😡', '😤'],
+    'neutral': ['😐', '🙂', '😶']
+}
+PUNCTUATION_PATTERNS = {
+    'exclamation': ['!', '！'],
+    'question': ['?', '？'],
+    'ellipsis': ['...', '…'],
+    'period': ['.', '。']
+}
+_STYLE_PATTERNS = [p for patterns in (EMOJI_PATTERNS, PUNCTUATION_PATTERNS) for ps in patterns.values() for p in ps]
+# 单字符符号用集合交集一次查出；多字符符号（如 '...'）只在首字符出现时才查找
+_STYLE_CHARS = frozenset(p for p in _STYLE_PATTERNS if len(p) == 1)
+_STYLE_MULTI = [p for p in _STYLE_PATTERNS if len(p) > 1]
+# 消息类型标记，按优先级排列：同时出现时取靠前的类型
+_MARKER_TYPES = {'http': 'with_link', '[图片]': 'with_image', '[语音]': 'with_voice'}
+_MARKER_RE = re.compile('|'.join(re.escape(marker) for marker in _MARKER_TYPES))
+_EMOJI_RE = re.compile('|'.join(re.escape(emoji) for emojis in EMOJI_PATTERNS.values() for emoji in emojis))
+
+# 所有关键词去重后统一编号，一个自动机一次扫描得到每条消息的命中情况
+_KEYWORDS = list(dict.fromkeys(
+    POSITIVE_WORDS + NEGATIVE_WORDS + NEUTRAL_WORDS + EMOTIONAL_WORDS
+    + SENTIMENT_POSITIVE_WORDS + SENTIMENT_NEGATIVE_WORDS
+    + [word for words in TOPIC_KEYWORDS.values() for word in words]
+    + TERMS_OF_ENDEARMENT + INTIMATE_KEYWORDS
+))
+_KEYWORD_IDS = {word: i for i, word in enumerate(_KEYWORDS)}
+
+def _keyword_ids(words) -> np.ndarray:
+    """关键词列表对应的列号（保留重复词，计数时与原列表一致）"""
+    return np.array([_KEYWORD_IDS[word] for word in words], dtype=np.intp)
+
+_POSITIVE_IDS = _keyword_ids(POSITIVE_WORDS)
+_NEGATIVE_IDS = _keyword_ids(NEGATIVE_WORDS)
+_NEUTRAL_IDS = _keyword_ids(NEUTRAL_WORDS)
+_EMOTIONAL_IDS = _keyword_ids(EMOTIONAL_WORDS)
+_SENTIMENT_POSITIVE_IDS = _keyword_ids(SENTIMENT_POSITIVE_WORDS)
+_SENTIMENT_NEGATIVE_IDS = _keyword_ids(SENTIMENT_NEGATIVE_WORDS)
+_TOPIC_IDS = {topic: _keyword_ids(words) for topic, words in TOPIC_KEYWORDS.items()}
+_INTIMATE_IDS = _keyword_ids(INTIMATE_KEYWORDS)
+
+def _build_automaton(words) -> ahocorasick.Automaton:
+    """构建 Aho-Corasick 自动机，一次扫描即可找出文本中出现的所有关键词（值为关键词编号）"""
+    automaton = ahocorasick.Automaton()
+    for i, word in enumerate(words):
+        automaton.add_word(word, i)
+    automaton.make_automaton()
+    return automaton
+
+_KEYWORD_AUTOMATON = _build_automaton(_KEYWORDS)
+
+def _join_contents(contents) -> Tuple[str, np.ndarray]:
+    """以换行拼接全部消息并返回每条消息的起始偏移；关键词不含换行，匹配不会跨消息"""
+    contents = list(contents)
+    starts = np.zeros(len(contents), dtype=np.int64)
+    if contents:
+        lengths = np.fromiter(map(len, contents), dtype=np.int64, count=len(contents))
+        np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    return '\n'.join(contents), starts
+
+def _scan_keywords(text: str, starts: np.ndarray) -> np.ndarray:
+    """对拼接文本做一次自动机扫描，按偏移映射回消息，得到消息 × 关键词的出现矩阵"""
+    hits = np.zeros((starts.size, len(_KEYWORDS)), dtype=bool)
+    found = np.array(list(_KEYWORD_AUTOMATON.iter(text)), dtype=np.int64).reshape(-1, 2)
+    rows = np.searchsorted(starts, found[:, 0], side='right') - 1
+    hits[rows, found[:, 1]] = True
+    return hits
+
+def _keyword_hits(contents) -> np.ndarray:
+    """每条消息 × 每个关键词的出现矩阵（bool）"""
+    return _scan_keywords(*_join_contents(contents))
+
+def _mean_density(hits: np.ndarray, lengths: np.ndarray) -> float:
+    """逐条消息的命中数 / 消息长度的平均值，空消息记为 0"""
+    if lengths.size == 0:
+        return 0
+    density = np.divide(hits, lengths, out=np.zeros(lengths.size), where=lengths > 0)
+    return float(density.mean())
+
+def _conversation_depth(is_user: np.ndarray) -> int:
+    """用户消息 +1、对方消息 -1 且不低于 0 的游走过程的最大值"""
+    if is_user.size == 0:
+        return 0
+    walk = np.cumsum(np.where(is_user, 1, -1))
+    # 截断在 0 的游走等于原始游走减去其历史最小值（不高于 0）
+    depth = walk - np.minimum.accumulate(np.minimum(walk, 0))
+    return int(depth.max())
+
+# 文化类话题，按 literature > movies > tv_shows > social_topics 的优先级归类
+_CULTURE_CATEGORIES = ('literature', 'movies', 'tv_shows', 'social_topics')
+_CULTURE_RE = re.compile(
+    r'(?P<literature>《[^》\n]*》|作者|作家)|(?P<movies>电影|导演|演员)'
+    r'|(?P<tv_shows>电视剧)|(?P<social_topics>新闻|社会|政治)'
+)
+
+def _scan_culture(text: str, starts: np.ndarray) -> np.ndarray:
+    """每条消息的文化话题类别（_CULTURE_CATEGORIES 下标，取优先级最高者），无匹配为 -1"""
+    rank = {category: i for i, category in enumerate(_CULTURE_CATEGORIES)}
+    matches = [(match.start(), rank[match.lastgroup]) for match in _CULTURE_RE.finditer(text)]
+    found = np.array(matches, dtype=np.int64).reshape(-1, 2)
+    categories = np.full(starts.size, len(_CULTURE_CATEGORIES), dtype=np.int64)
+    np.minimum.at(categories, np.searchsorted(starts, found[:, 0], side='right') - 1, found[:, 1])
+    categories[categories == len(_CULTURE_CATEGORIES)] = -1
+    return categories
+
+def _parse_date(date: str) -> datetime:
+    """解析 'YYYY-MM-DD' 日期，标准写法走更快的 fromisoformat"""
+    if len(date) == 10 and date[4] == date[7] == '-':
+        return datetime.fromisoformat(date)
+    return datetime.strptime(date, '%Y-%m-%d')
+
+def _json_default(obj):
+    """orjson 无法直接处理的类型：时间统一输出为 '%Y-%m-%d %H:%M:%S'"""
+    if isinstance(obj, datetime):
+        return obj.strftime('%Y-%m-%d %H:%M:%S')
+    raise TypeError
+
+class _MessageArrays:
+    """消息的列式存储（按时间稳定排序），数值统计直接在数组上向量化完成"""
+    def __init__(self, messages: List[Dict[str, Any]]):
+        self.source = messages
+        timestamps = np.array([msg['timestamp'] for msg in messages], dtype='datetime64[s]')
+        if timestamps.size > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            order = np.argsort(timestamps, kind='stable')
+            messages = [messages[i] for i in order]
+            timestamps = timestamps[order]
+        self.messages = messages
+        self.timestamps = timestamps
+        self.hours = timestamps.astype('datetime64[h]').astype(np.int64) % 24  # 每条消息所在的小时
+        self.lengths = np.fromiter((len(msg['content']) for msg in messages), dtype=np.int64, count=len(messages))
+        self.is_user = np.fromiter((msg['is_user'] for msg in messages), dtype=bool, count=len(messages))
+        text, starts = _join_contents(msg['content'] for msg in messages)
+        self.hits = _scan_keywords(text, starts)
+        self.culture = _scan_culture(text, starts)
+        self.keyword_counts = self.hits.sum(axis=0)  # 每个关键词出现过的消息数
+        # 逐条情感词密度的前缀和，任意区间的情感强度都可 O(1) 求出
+        density = np.divide(self.hits[:, _EMOTIONAL_IDS].sum(axis=1), self.lengths,
+                            out=np.zeros(len(messages)), where=self.lengths > 0)
+        self.density_prefix = np.concatenate(([0.0], np.cumsum(density)))
+        self.attitude_cache = {}  # (start, stop) -> _analyze_attitude 结果，重叠的窗口直接复用
 
 class KeyMomentsAnalyzer:
     def __init__(self, chat_file: str, user_name: str, partner_name: str):
@@ -10,6 +176,7 @@ class KeyMomentsAnalyzer:
         self.user_name = user_name
         self.partner_name = partner_name
         self.messages = []  # 添加 messages 属性
+        self._arrays = None  # messages 的列式存储，在 extract_landmark_topics 中构建
         self.key_dates = {
             'relationship_start': None,  # 正式确定关系的时间
             'conflicts': [],             # 吵架的时间点
@@ -30,25 +197,26 @@ class KeyMomentsAnalyzer:
         
     def set_key_date(self, date_type: str, date: str, description: str = ""):
         """设置关键时间节点"""
+        parsed_date = _parse_date(date)
         if date_type == 'relationship_start':
             self.key_dates['relationship_start'] = {
-                'date': datetime.strptime(date, '%Y-%m-%d'),
+                'date': parsed_date,
                 'description': description
             }
         elif date_type == 'conflict':
             self.key_dates['conflicts'].append({
-                'date': datetime.strptime(date, '%Y-%m-%d'),
+                'date': parsed_date,
                 'description': description
             })
         elif date_type in ['anniversary', 'valentine', 'qixi']:
             if date_type == 'anniversary':
                 self.key_dates['special_days']['anniversary'] = {
-                    'date': datetime.strptime(date, '%Y-%m-%d'),
+                    'date': parsed_date,
                     'description': description
                 }
             else:
                 self.key_dates['special_days'][date_type].append({
-                    'date': datetime.strptime(date, '%Y-%m-%d'),
+                    'date': parsed_date,
                     'description': description
                 })
 
@@ -57,110 +225,165 @@ class KeyMomentsAnalyzer:
                                days_before: int = 7, 
                                days_after: int = 7) -> Dict[str, Any]:
         """分析关键时间点前后的态度变化"""
-        start_date = key_date - timedelta(days=days_before)
-        end_date = key_date + timedelta(days=days_after)
-        
-        before_messages = []
-        after_messages = []
-        
-        for msg in messages:
-            msg_date = msg['timestamp']  # 直接使用时间戳，不需要转换
-            if start_date <= msg_date < key_date:
-                before_messages.append(msg)
-            elif key_date <= msg_date <= end_date:
-                after_messages.append(msg)
-        
-        return {
-            'before': self._analyze_attitude(before_messages),
-            'after': self._analyze_attitude(after_messages),
-            'change': self._compare_attitudes(
-                self._analyze_attitude(before_messages),
-                self._analyze_attitude(after_messages)
-            )
-        }
+        return self._attitude_changes_batch(messages, [key_date], days_before, days_after)[0]
+
+    def _attitude_changes_batch(self, messages: List[Dict[str, Any]], 
+                                key_dates: List[datetime], 
+                                days_before: int = 7, 
+                                days_after: int = 7) -> List[Dict[str, Any]]:
+        """批量分析多个关键时间点前后的态度变化，所有窗口边界一次二分查找得到"""
+        arrays = self._get_arrays() if messages is self.messages else _MessageArrays(messages)
+        keys = np.array(key_dates, dtype='datetime64[s]')
+        starts = keys - np.timedelta64(days_before, 'D')
+        ends = keys + np.timedelta64(days_after, 'D')
+        # 时间戳已排序：before = [i0, i1)，after = [i1, i2)
+        i0 = np.searchsorted(arrays.timestamps, starts)
+        i1 = np.searchsorted(arrays.timestamps, keys)
+        i2 = np.maximum(i1, np.searchsorted(arrays.timestamps, ends, side='right'))
+        
+        changes = []
+        for start, key, end in zip(i0.tolist(), i1.tolist(), i2.tolist()):
+            before = self._cached_attitude(arrays, start, key)
+            after = self._cached_attitude(arrays, key, end)
+            changes.append({
+                'before': before,
+                'after': after,
+                'change': self._compare_attitudes(before, after)
+            })
+        return changes
 
-    def _analyze_attitude(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """分析消息中的态度"""
-        user_messages = [msg for msg in messages if msg['is_user']]
-        partner_messages = [msg for msg in messages if not msg['is_user']]
-        
-        # 分析情感词汇使用
-        positive_words = ['喜欢', '爱', '开心', '高兴', '幸福', '好', '棒', '美', '赞', '可爱']
-        negative_words = ['讨厌', '生气', '难过', '伤心', '不好', '烦', '累', '困', '忙', '烦']
-        neutral_words = ['嗯', '哦', '好', '行', '可以', '知道', '明白', '了解']
-        
-        def analyze_word_usage(messages):
-            content = ' '.join(msg['content'] for msg in messages)
+    def _get_arrays(self) -> _MessageArrays:
+        """self.messages 的列式存储，messages 被替换时重新构建"""
+        if self._arrays is None or self._arrays.source is not self.messages:
+            self._arrays = _MessageArrays(self.messages)
+        return self._arrays
+
+    def _split_index(self, date: datetime) -> int:
+        """时间不晚于 date 的消息条数，即按 date 切分时的分界下标"""
+        return int(np.searchsorted(self._get_arrays().timestamps, np.datetime64(date, 's'), side='right'))
+
+    def _slice_before(self, date: datetime) -> List[Dict[str, Any]]:
+        """时间不晚于 date 的消息"""
+        return self._get_arrays().messages[:self._split_index(date)]
+
+    def _slice_after(self, date: datetime) -> List[Dict[str, Any]]:
+        """时间晚于 date 的消息"""
+        return self._get_arrays().messages[self._split_index(date):]
+
+    def _intensity_before(self, date: datetime) -> float:
+        """时间不晚于 date 的消息的情感强度"""
+        return self._window_intensity(0, self._split_index(date))
+
+    def _intensity_after(self, date: datetime) -> float:
+        """时间晚于 date 的消息的情感强度"""
+        return self._window_intensity(self._split_index(date), len(self._get_arrays().messages))
+
+    def _window_intensity(self, start: int, stop: int) -> float:
+        """[start, stop) 区间内消息的情感强度，由情感词密度的前缀和 O(1) 得到"""
+        if stop <= start:
+            return 0
+        prefix = self._get_arrays().density_prefix
+        return float((prefix[stop] - prefix[start]) / (stop - start))
+
+    def _between_range(self, start_date: datetime, end_date: datetime) -> Tuple[int, int]:
+        """时间在 [start_date, end_date] 内的消息的下标区间"""
+        timestamps = self._get_arrays().timestamps
+        start = np.searchsorted(timestamps, np.datetime64(start_date, 's'), side='left')
+        stop = np.searchsorted(timestamps, np.datetime64(end_date, 's'), side='right')
+        return int(start), int(max(start, stop))
+
+    def _slice_between(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+        """时间在 [start_date, end_date] 内的消息"""
+        start, stop = self._between_range(start_date, end_date)
+        return self._get_arrays().messages[start:stop]
+
+    def _near_range(self, timestamp: datetime, seconds: int = 3600) -> Tuple[int, int]:
+        """与 timestamp 相差不到 seconds 秒的消息的下标区间，在已排序的时间戳上二分查找"""
+        timestamps = self._get_arrays().timestamps
+        center = np.datetime64(timestamp, 's')
+        delta = np.timedelta64(seconds, 's')
+        start = np.searchsorted(timestamps, center - delta, side='right')
+        stop = np.searchsorted(timestamps, center + delta, side='left')
+        return int(start), int(max(start, stop))
+
+    def _cached_attitude(self, arrays: _MessageArrays, start: int, stop: int) -> Dict[str, Any]:
+        """带缓存的 _analyze_attitude，同一窗口只计算一次"""
+        key = (start, stop)
+        if key not in arrays.attitude_cache:
+            arrays.attitude_cache[key] = self._analyze_attitude(arrays, start, stop)
+        return arrays.attitude_cache[key]
+
+    def _analyze_attitude(self, arrays: _MessageArrays, start: int, stop: int) -> Dict[str, Any]:
+        """分析消息中的态度，[start, stop) 为窗口在 arrays 中的下标区间"""
+        index = np.arange(start, stop)
+        user_index = index[arrays.is_user[index]]
+        partner_index = index[~arrays.is_user[index]]
+        user_messages = [arrays.messages[i] for i in user_index]
+        partner_messages = [arrays.messages[i] for i in partner_index]
+        
+        # 分析情感词汇使用（统计窗口内出现过的情感词）
+        def analyze_word_usage(index):
+            present = arrays.hits[index].any(axis=0)
             return {
-                'positive_count': sum(1 for word in positive_words if word in content),
-                'negative_count': sum(1 for word in negative_words if word in content),
-                'neutral_count': sum(1 for word in neutral_words if word in content),
-                'total_words': len(content)
+                'positive_count': int(present[_POSITIVE_IDS].sum()),
+                'negative_count': int(present[_NEGATIVE_IDS].sum()),
+                'neutral_count': int(present[_NEUTRAL_IDS].sum()),
+                # 等于以空格拼接全部内容后的长度
+                'total_words': int(arrays.lengths[index].sum()) + max(index.size - 1, 0)
             }
         
         # 分析消息长度分布
-        def analyze_message_length(messages):
-            lengths = [len(msg['content']) for msg in messages]
+        def analyze_message_length(index):
+            if index.size == 0:
+                return {'avg_length': 0, 'max_length': 0, 'min_length': 0,
+                        'short_messages_ratio': 0, 'long_messages_ratio': 0}
+            lengths = arrays.lengths[index]
             return {
-                'avg_length': sum(lengths) / len(lengths) if lengths else 0,
-                'max_length': max(lengths) if lengths else 0,
-                'min_length': min(lengths) if lengths else 0,
-                'short_messages_ratio': sum(1 for l in lengths if l < 5) / len(lengths) if lengths else 0,
-                'long_messages_ratio': sum(1 for l in lengths if l > 20) / len(lengths) if lengths else 0
+                'avg_length': float(lengths.mean()),
+                'max_length': int(lengths.max()),
+                'min_length': int(lengths.min()),
+                'short_messages_ratio': float((lengths < 5).mean()),
+                'long_messages_ratio': float((lengths > 20).mean())
             }
         
         # 分析回复时间模式
-        def analyze_response_pattern(messages):
-            if len(messages) < 2:
+        def analyze_response_pattern(index):
+            if index.size < 2:
                 return {'avg_response_time': 0, 'response_consistency': 0}
             
-            response_times = []
-            for i in range(1, len(messages)):
-                time_diff = (messages[i]['timestamp'] - messages[i-1]['timestamp']).total_seconds()
-                response_times.append(time_diff)
-            
-            avg_time = sum(response_times) / len(response_times) if response_times else 0
-            std_dev = (sum((t - avg_time) ** 2 for t in response_times) / len(response_times)) ** 0.5 if response_times else 0
+            response_times = np.diff(arrays.timestamps[index]).astype(np.float64)
+            avg_time = float(response_times.mean())
+            std_dev = float(response_times.std())
             
             return {
                 'avg_response_time': avg_time,
                 'response_consistency': 1 - (std_dev / avg_time) if avg_time > 0 else 0,
-                'quick_responses_ratio': sum(1 for t in response_times if t < 300) / len(response_times) if response_times else 0,
-                'slow_responses_ratio': sum(1 for t in response_times if t > 3600) / len(response_times) if response_times else 0
+                'quick_responses_ratio': float((response_times < 300).mean()),
+                'slow_responses_ratio': float((response_times > 3600).mean())
             }
         
         # 分析话题多样性
-        def analyze_topic_diversity(messages):
-            topics = set()
-            for msg in messages:
-                content = msg['content'].lower()
-                if any(keyword in content for keyword in ['电影', '电视剧', '书', '新闻']):
-                    topics.add('entertainment')
-                if any(keyword in content for keyword in ['工作', '学习', '项目']):
-                    topics.add('work')
-                if any(keyword in content for keyword in ['吃', '玩', '旅行']):
-                    topics.add('life')
-                if any(keyword in content for keyword in ['爱', '喜欢', '想']):
-                    topics.add('relationship')
-            return len(topics)
+        def analyze_topic_diversity(index):
+            present = arrays.hits[index].any(axis=0)
+            return sum(1 for ids in _TOPIC_IDS.values() if present[ids].any())
         
         return {
             'user': {
                 'message_count': len(user_messages),
-                'word_usage': analyze_word_usage(user_messages),
-                'message_length': analyze_message_length(user_messages),
-                'response_pattern': analyze_response_pattern(user_messages),
-                'topic_diversity': analyze_topic_diversity(user_messages),
-                'active_hours': self._analyze_active_hours(user_messages),
+                'word_usage': analyze_word_usage(user_index),
+                'message_length': analyze_message_length(user_index),
+                'response_pattern': analyze_response_pattern(user_index),
+                'topic_diversity': analyze_topic_diversity(user_index),
+                'active_hours': self._analyze_active_hours(arrays.hours[user_index]),
                 'message_style': self._analyze_message_style(user_messages)
             },
             'partner': {
                 'message_count': len(partner_messages),
-                'word_usage': analyze_word_usage(partner_messages),
-                'message_length': analyze_message_length(partner_messages),
-                'response_pattern': analyze_response_pattern(partner_messages),
-                'topic_diversity': analyze_topic_diversity(partner_messages),
-                'active_hours': self._analyze_active_hours(partner_messages),
+                'word_usage': analyze_word_usage(partner_index),
+                'message_length': analyze_message_length(partner_index),
+                'response_pattern': analyze_response_pattern(partner_index),
+                'topic_diversity': analyze_topic_diversity(partner_index),
+                'active_hours': self._analyze_active_hours(arrays.hours[partner_index]),
                 'message_style': self._analyze_message_style(partner_messages)
             }
         }
@@ -186,53 +409,61 @@ class KeyMomentsAnalyzer:
         """提取标志性话题"""
         print("\n开始提取标志性话题...")
         self.messages = messages  # 保存消息到实例属性
-        terms_of_endearment = ['宝贝', '宝宝', '亲爱的', '老公', '老婆', '亲爱的']
-        intimate_keywords = ['性', '爱', '亲密', '身体', '关系']
-        
-        total_messages = len(messages)
-        for i, msg in enumerate(messages, 1):
-            if i % 100 == 0:
-                print(f"\r正在处理第 {i}/{total_messages} 条消息... ({(i/total_messages*100):.1f}%)", end="", flush=True)
-            
-            content = msg['content'].lower()
-            sender = 'user' if msg['is_user'] else 'partner'
-            
-            # 检查亲昵称呼
-            for term in terms_of_endearment:
-                if term in content:
-                    if not any(t['term'] == term for t in self.landmark_topics['terms_of_endearment']):
-                        self.landmark_topics['terms_of_endearment'].append({
-                            'term': term,
-                            'first_occurrence': msg['timestamp'],
-                            'sender': sender
-                        })
-                        print(f"\n发现新的亲昵称呼: {term} (时间: {msg['timestamp']})")
-            
-            # 检查亲密话题
-            if any(keyword in content for keyword in intimate_keywords):
-                if not any(t['timestamp'] == msg['timestamp'] for t in self.landmark_topics['intimate_topics']):
-                    self.landmark_topics['intimate_topics'].append({
-                        'timestamp': msg['timestamp'],
-                        'content': content,
-                        'sender': sender
-                    })
-                    print(f"\n发现亲密话题讨论 (时间: {msg['timestamp']})")
-            
-            # 检查文化相关话题
-            if re.search(r'《.*》|作者|作家|导演|演员|电影|电视剧|新闻|社会|政治', content):
-                category = 'literature' if re.search(r'《.*》|作者|作家', content) else \
-                          'movies' if re.search(r'电影|导演|演员', content) else \
-                          'tv_shows' if re.search(r'电视剧', content) else \
-                          'social_topics'
-                
-                if not any(t['timestamp'] == msg['timestamp'] for t in self.landmark_topics[category]):
-                    self.landmark_topics[category].append({
-                        'timestamp': msg['timestamp'],
-                        'content': content,
-                        'sender': sender
-                    })
-                    print(f"\n发现{category}相关讨论 (时间: {msg['timestamp']})")
-        
+        self._arrays = _MessageArrays(messages)
+        if self._arrays.messages is messages:
+            hits, culture = self._arrays.hits, self._arrays.culture
+        else:
+            text, starts = _join_contents(msg['content'] for msg in messages)
+            hits, culture = _scan_keywords(text, starts), _scan_culture(text, starts)
+        # 已记录的称呼与时间戳，用集合做 O(1) 去重
+        seen_terms = {t['term'] for t in self.landmark_topics['terms_of_endearment']}
+        seen_timestamps = {category: {t['timestamp'] for t in topics}
+                           for category, topics in self.landmark_topics.items() if category != 'terms_of_endearment'}
+        
+        # (消息下标, 检查顺序, 类别, 记录, 提示)，整体按消息顺序写入
+        found = []
+        
+        # 检查亲昵称呼：每个称呼只记录首次出现
+        for order, term in enumerate(TERMS_OF_ENDEARMENT):
+            column = hits[:, _KEYWORD_IDS[term]]
+            if term not in seen_terms and column.any():
+                seen_terms.add(term)
+                row = int(column.argmax())
+                msg = messages[row]
+                found.append((row, order, 'terms_of_endearment', {
+                    'term': term,
+                    'first_occurrence': msg['timestamp'],
+                    'sender': 'user' if msg['is_user'] else 'partner'
+                }, f"发现新的亲昵称呼: {term} (时间: {msg['timestamp']})"))
+        
+        # 检查亲密话题
+        for row in np.flatnonzero(hits[:, _INTIMATE_IDS].any(axis=1)).tolist():
+            msg = messages[row]
+            if msg['timestamp'] not in seen_timestamps['intimate_topics']:
+                seen_timestamps['intimate_topics'].add(msg['timestamp'])
+                found.append((row, len(TERMS_OF_ENDEARMENT), 'intimate_topics', {
+                    'timestamp': msg['timestamp'],
+                    'content': msg['content'].lower(),
+                    'sender': 'user' if msg['is_user'] else 'partner'
+                }, f"发现亲密话题讨论 (时间: {msg['timestamp']})"))
+        
+        # 检查文化相关话题
+        for row in np.flatnonzero(culture >= 0).tolist():
+            msg = messages[row]
+            category = _CULTURE_CATEGORIES[culture[row]]
+            if msg['timestamp'] not in seen_timestamps[category]:
+                seen_timestamps[category].add(msg['timestamp'])
+                found.append((row, len(TERMS_OF_ENDEARMENT) + 1, category, {
+                    'timestamp': msg['timestamp'],
+                    'content': msg['content'].lower(),
+                    'sender': 'user' if msg['is_user'] else 'partner'
+                }, f"发现{category}相关讨论 (时间: {msg['timestamp']})"))
+        
+        found.sort(key=lambda item: item[:2])
+        for _, _, category, topic, _ in found:
+            self.landmark_topics[category].append(topic)
+        if found:
+            print("\n" + "\n".join(item[4] for item in found))
         print("\n标志性话题提取完成！")
 
     def _calculate_avg_response_time(self, messages: List[Dict[str, Any]]) -> float:
@@ -240,69 +471,50 @@ class KeyMomentsAnalyzer:
         if len(messages) < 2:
             return 0
         
-        total_time = 0
-        for i in range(1, len(messages)):
-            prev_time = messages[i-1]['timestamp']  # 直接使用时间戳
-            curr_time = messages[i]['timestamp']    # 直接使用时间戳
-            total_time += (curr_time - prev_time).total_seconds()
-        
+        # 相邻间隔之和首尾相消，等于首末两条消息的时间差
+        total_time = (messages[-1]['timestamp'] - messages[0]['timestamp']).total_seconds()
         return total_time / (len(messages) - 1)
 
     def _analyze_sentiment(self, messages: List[Dict[str, Any]]) -> float:
         """分析消息情感倾向"""
-        positive_keywords = ['喜欢', '爱', '开心', '高兴', '幸福', '好']
-        negative_keywords = ['讨厌', '生气', '难过', '伤心', '不好', '烦']
-        
-        sentiment_score = 0
-        for msg in messages:
-            content = msg['content']
-            for keyword in positive_keywords:
-                if keyword in content:
-                    sentiment_score += 1
-            for keyword in negative_keywords:
-                if keyword in content:
-                    sentiment_score -= 1
-        
+        hits = _keyword_hits(msg['content'] for msg in messages)
+        sentiment_score = int(hits[:, _SENTIMENT_POSITIVE_IDS].sum()) - int(hits[:, _SENTIMENT_NEGATIVE_IDS].sum())
         return sentiment_score / len(messages) if messages else 0
 
     def save_results(self, output_dir: str):
         """保存分析结果"""
         print("\n正在保存分析结果...")
         
-        # 自定义 JSON 序列化函数
-        def datetime_handler(obj):
-            if isinstance(obj, datetime):
-                return obj.strftime('%Y-%m-%d %H:%M:%S')
-            return obj
+        # 所有关键时间点的态度变化一次批量计算
+        special_days = [(day_type, day)
+                        for day_type, days in self.key_dates['special_days'].items()
+                        for day in (days if isinstance(days, list) else [days] if days else [])]
+        start = self.key_dates['relationship_start']
+        dates = ([start['date']] if start else []) + \
+                [conflict['date'] for conflict in self.key_dates['conflicts']] + \
+                [day['date'] for _, day in special_days]
+        changes = self._attitude_changes_batch(self.messages, dates)
+        start_change = changes.pop(0) if start else None
+        conflict_changes = changes[:len(self.key_dates['conflicts'])]
+        special_changes = changes[len(self.key_dates['conflicts']):]
         
         results = {
             'key_dates': self.key_dates,
             'landmark_topics': self.landmark_topics,
             'attitude_changes': {
-                'relationship_start': self.analyze_attitude_changes(
-                    self.messages, 
-                    self.key_dates['relationship_start']['date']
-                ) if self.key_dates['relationship_start'] else None,
-                'conflicts': [
-                    self.analyze_attitude_changes(
-                        self.messages, 
-                        conflict['date']
-                    ) for conflict in self.key_dates['conflicts']
-                ],
+                'relationship_start': start_change,
+                'conflicts': conflict_changes,
                 'special_days': {
-                    day_type: self.analyze_attitude_changes(
-                        self.messages, 
-                        day['date']
-                    ) for day_type, days in self.key_dates['special_days'].items()
-                    for day in (days if isinstance(days, list) else [days] if days else [])
+                    day_type: change for (day_type, _), change in zip(special_days, special_changes)
                 }
             }
         }
         
         os.makedirs(output_dir, exist_ok=True)
         output_file = os.path.join(output_dir, 'key_moments_analysis.json')
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2, default=datetime_handler)
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(results, default=_json_default,
+                                 option=orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATETIME))
         
         print(f"分析结果已保存到: {output_file}")
         
@@ -464,11 +676,12 @@ class KeyMomentsAnalyzer:
 
     def _analyze_stage_characteristics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """分析特定阶段的特征"""
-        stage_messages = [msg for msg in self.messages if start_date <= msg['timestamp'] <= end_date]
+        start, stop = self._between_range(start_date, end_date)
+        stage_messages = self._get_arrays().messages[start:stop]
         return {
             'message_frequency': len(stage_messages) / (end_date - start_date).days if (end_date - start_date).days > 0 else 0,
             'topic_diversity': self._calculate_topic_diversity(stage_messages),
-            'emotional_intensity': self._calculate_emotional_intensity(stage_messages),
+            'emotional_intensity': self._window_intensity(start, stop),
             'interaction_pattern': self._analyze_interaction_pattern(stage_messages)
         }
 
@@ -493,30 +706,32 @@ class KeyMomentsAnalyzer:
 
     def _analyze_terms_evolution(self) -> List[Dict[str, Any]]:
         """分析亲昵称呼的演变"""
-        evolution = []
         terms = sorted(self.landmark_topics['terms_of_endearment'], key=lambda x: x['first_occurrence'])
-        
-        for i in range(len(terms)):
-            evolution.append({
-                'term': terms[i]['term'],
-                'first_use': terms[i]['first_occurrence'],
-                'usage_frequency': self._calculate_term_frequency(terms[i]['term']),
-                'adoption_pattern': self._analyze_term_adoption(terms[i])
-            })
-        
-        return evolution
+        return [{'term': term['term'], 'first_use': term['first_occurrence'], **self._term_stats(term['term'])}
+                for term in terms]
 
     def _analyze_intimate_topics_evolution(self) -> List[Dict[str, Any]]:
         """分析亲密话题的演变"""
         evolution = []
         topics = sorted(self.landmark_topics['intimate_topics'], key=lambda x: x['timestamp'])
         
-        for i in range(len(topics)):
+        for topic in topics:
+            # 话题前后一小时内的消息
+            start, stop = self._near_range(topic['timestamp'])
+            related_messages = self._get_arrays().messages[start:stop]
+            intensity = self._window_intensity(start, stop)
             evolution.append({
-                'timestamp': topics[i]['timestamp'],
-                'topic_depth': self._analyze_topic_depth(topics[i]),
-                'discussion_pattern': self._analyze_discussion_pattern(topics[i]),
-                'follow_up_impact': self._analyze_follow_up_impact(topics[i])
+                'timestamp': topic['timestamp'],
+                'topic_depth': len(related_messages),
+                'discussion_pattern': {
+                    'initiation': topic['sender'],
+                    'development': self._calculate_topic_diversity(related_messages),
+                    'conclusion': intensity
+                },
+                'follow_up_impact': {
+                    'immediate_impact': intensity,
+                    'long_term_impact': self._analyze_long_term_impact(topic['timestamp'])
+                }
             })
         
         return evolution
@@ -559,26 +774,16 @@ class KeyMomentsAnalyzer:
 
     def _calculate_topic_diversity(self, messages: List[Dict[str, Any]]) -> float:
         """计算话题多样性"""
-        topics = set()
-        for msg in messages:
-            content = msg['content'].lower()
-            if any(keyword in content for keyword in ['电影', '电视剧', '书', '新闻']):
-                topics.add('entertainment')
-            if any(keyword in content for keyword in ['工作', '学习', '项目']):
-                topics.add('work')
-            if any(keyword in content for keyword in ['吃', '玩', '旅行']):
-                topics.add('life')
-        return len(topics) / len(messages) if messages else 0
+        present = _keyword_hits(msg['content'] for msg in messages).any(axis=0)
+        topics = sum(1 for topic in ('entertainment', 'work', 'life') if present[_TOPIC_IDS[topic]].any())
+        return topics / len(messages) if messages else 0
 
     def _calculate_emotional_intensity(self, messages: List[Dict[str, Any]]) -> float:
         """计算情感强度"""
-        intensity = 0
-        for msg in messages:
-            content = msg['content']
-            # 计算情感词密度
-            emotional_words = sum(1 for word in ['喜欢', '爱', '开心', '难过', '生气'] if word in content)
-            intensity += emotional_words / len(content) if content else 0
-        return intensity / len(messages) if messages else 0
+        # 计算情感词密度
+        hits = _keyword_hits(msg['content'] for msg in messages)[:, _EMOTIONAL_IDS].sum(axis=1)
+        lengths = np.fromiter((len(msg['content']) for msg in messages), dtype=np.int64, count=len(messages))
+        return _mean_density(hits, lengths)
 
     def _analyze_interaction_pattern(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
         """分析互动模式"""
@@ -593,292 +798,172 @@ class KeyMomentsAnalyzer:
 
     def _calculate_conversation_depth(self, messages: List[Dict[str, Any]]) -> float:
         """计算对话深度"""
-        depth = 0
-        current_depth = 0
-        for msg in messages:
-            if msg['is_user']:
-                current_depth += 1
-                depth = max(depth, current_depth)
-            else:
-                current_depth = max(0, current_depth - 1)
-        return depth
+        return _conversation_depth(np.fromiter((msg['is_user'] for msg in messages), dtype=bool, count=len(messages)))
 
     def _calculate_term_frequency(self, term: str) -> float:
         """计算称呼使用频率"""
         total_messages = len(self.messages)
-        term_count = sum(1 for msg in self.messages if term in msg['content'])
+        if term in _KEYWORD_IDS:
+            # 直接读取关键词命中矩阵的列计数
+            term_count = int(self._get_arrays().keyword_counts[_KEYWORD_IDS[term]])
+        else:
+            term_count = sum(1 for msg in self.messages if term in msg['content'])
         return term_count / total_messages if total_messages > 0 else 0
 
-    def _analyze_term_adoption(self, term: Dict[str, Any]) -> Dict[str, Any]:
-        """分析称呼采用模式"""
-        return {
-            'initial_usage': self._analyze_initial_usage(term),
-            'adoption_speed': self._analyze_adoption_speed(term),
-            'usage_consistency': self._analyze_usage_consistency(term)
-        }
-
-    def _analyze_topic_depth(self, topic: Dict[str, Any]) -> int:
-        """分析话题深度"""
-        related_messages = [msg for msg in self.messages 
-                          if abs((msg['timestamp'] - topic['timestamp']).total_seconds()) < 3600]
-        return len(related_messages)
-
-    def _analyze_discussion_pattern(self, topic: Dict[str, Any]) -> Dict[str, Any]:
-        """分析讨论模式"""
-        return {
-            'initiation': self._analyze_topic_initiation(topic),
-            'development': self._analyze_topic_development(topic),
-            'conclusion': self._analyze_topic_conclusion(topic)
-        }
-
-    def _analyze_follow_up_impact(self, topic: Dict[str, Any]) -> Dict[str, Any]:
-        """分析后续影响"""
+    def _term_stats(self, term: str) -> Dict[str, float]:
+        """分析称呼采用模式：使用频率、采用速度与使用一致性"""
+        frequency = self._calculate_term_frequency(term)
         return {
-            'immediate_impact': self._analyze_immediate_impact(topic),
-            'long_term_impact': self._analyze_long_term_impact(topic['timestamp'])
-        }
-
-    def _analyze_initial_usage(self, term: Dict[str, Any]) -> Dict[str, Any]:
-        """分析称呼初始使用"""
-        return {
-            'first_use': term['first_occurrence'],
-            'usage_frequency': self._calculate_term_frequency(term['term'])
-        }
-
-    def _analyze_adoption_speed(self, term: Dict[str, Any]) -> Dict[str, Any]:
-        """分析称呼采用速度"""
-        return {
-            'adoption_speed': self._calculate_term_frequency(term['term'])
-        }
-
-    def _analyze_usage_consistency(self, term: Dict[str, Any]) -> Dict[str, Any]:
-        """分析称呼使用一致性"""
-        return {
-            'usage_consistency': self._calculate_term_frequency(term['term'])
-        }
-
-    def _analyze_topic_initiation(self, topic: Dict[str, Any]) -> Dict[str, Any]:
-        """分析话题发起"""
-        return {
-            'initiation_pattern': self._analyze_discussion_pattern(topic)
-        }
-
-    def _analyze_topic_development(self, topic: Dict[str, Any]) -> Dict[str, Any]:
-        """分析话题发展"""
-        return {
-            'topic_development': self._calculate_topic_diversity(
-                [msg for msg in self.messages if abs((msg['timestamp'] - topic['timestamp']).total_seconds()) < 3600]
-            )
-        }
-
-    def _analyze_topic_conclusion(self, topic: Dict[str, Any]) -> Dict[str, Any]:
-        """分析话题结论"""
-        return {
-            'conclusion_pattern': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if abs((msg['timestamp'] - topic['timestamp']).total_seconds()) < 3600]
-            )
-        }
-
-    def _analyze_immediate_impact(self, topic: Dict[str, Any]) -> Dict[str, Any]:
-        """分析直接影响"""
-        return {
-            'immediate_impact': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if abs((msg['timestamp'] - topic['timestamp']).total_seconds()) < 3600]
-            )
+            'usage_frequency': frequency,
+            'adoption_speed': frequency,
+            'usage_consistency': frequency
         }
 
     def _analyze_long_term_impact(self, date: datetime) -> Dict[str, Any]:
         """分析长期影响"""
         return {
-            'long_term_impact': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
-            )
+            'long_term_impact': self._intensity_before(date)
         }
 
     def _analyze_preparation_pattern(self, date: datetime) -> Dict[str, Any]:
         """分析准备模式"""
         return {
-            'preparation_pattern': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
-            )
+            'preparation_pattern': self._intensity_before(date)
         }
 
     def _analyze_celebration_pattern(self, date: datetime) -> Dict[str, Any]:
         """分析庆祝模式"""
         return {
-            'celebration_pattern': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
-            )
+            'celebration_pattern': self._intensity_before(date)
         }
 
     def _analyze_aftermath_impact(self, date: datetime) -> Dict[str, Any]:
         """分析后续影响"""
         return {
-            'aftermath_impact': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] > date]
-            )
+            'aftermath_impact': self._intensity_after(date)
         }
 
     def _analyze_gift_pattern(self, date: datetime) -> Dict[str, Any]:
         """分析礼物模式"""
         return {
-            'gift_pattern': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
-            )
+            'gift_pattern': self._intensity_before(date)
         }
 
     def _analyze_cultural_significance(self, date: datetime) -> Dict[str, Any]:
         """分析文化意义"""
         return {
-            'cultural_significance': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
-            )
+            'cultural_significance': self._intensity_before(date)
         }
 
     def _analyze_preparation_behavior(self, date: datetime) -> Dict[str, Any]:
         """分析准备行为"""
         return {
-            'preparation_behavior': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
-            )
+            'preparation_behavior': self._intensity_before(date)
         }
 
     def _analyze_celebration_quality(self, date: datetime) -> Dict[str, Any]:
         """分析庆祝质量"""
         return {
-            'celebration_quality': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
-            )
+            'celebration_quality': self._intensity_before(date)
         }
 
     def _analyze_aftermath_effect(self, date: datetime) -> Dict[str, Any]:
         """分析后续效果"""
         return {
-            'aftermath_effect': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] > date]
-            )
+            'aftermath_effect': self._intensity_after(date)
         }
 
     def _analyze_conflict_resolution(self, date: datetime) -> Dict[str, Any]:
         """分析冲突解决"""
         return {
             'resolution_time': self._calculate_avg_response_time(
-                [msg for msg in self.messages if msg['timestamp'] <= date]
+                self._slice_before(date)
             )
         }
 
     def _analyze_recovery_pattern(self, date: datetime) -> Dict[str, Any]:
         """分析恢复模式"""
         return {
-            'recovery_pattern': self._calculate_emotional_intensity(
-                [msg for msg in self.messages if msg['timestamp'] > date]
-            )
+            'recovery_pattern': self._intensity_after(date)
         }
 
     def _calculate_recovery_time(self, date: datetime) -> Dict[str, Any]:
         """计算恢复时间"""
         return {
             'recovery_time': self._calculate_avg_response_time(
-                [msg for msg in self.messages if msg['timestamp'] > date]
+                self._slice_after(date)
             )
         }
 
     def _get_messages_in_period(self, date):
-        return [msg for msg in self.messages if date <= msg['timestamp'] <= date + timedelta(days=1)]
+        return self._slice_between(date, date + timedelta(days=1))
 
     def _calculate_sentiment(self, messages):
-        positive_keywords = ['喜欢', '爱', '开心', '高兴', '幸福', '好']
-        negative_keywords = ['讨厌', '生气', '难过', '伤心', '不好', '烦']
-        
-        sentiment_score = 0
-        for msg in messages:
-            content = msg['content']
-            for keyword in positive_keywords:
-                if keyword in content:
-                    sentiment_score += 1
-            for keyword in negative_keywords:
-                if keyword in content:
-                    sentiment_score -= 1
-        
-        return sentiment_score / len(messages) if messages else 0
+        # 与 _analyze_sentiment 相同：一次自动机扫描得到每条消息出现的正负面词
+        return self._analyze_sentiment(messages)
 
     def _extract_key_messages(self, messages):
         return [msg['content'] for msg in messages if msg['is_user']]
 
-    def _analyze_active_hours(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """分析活跃时间段"""
-        hour_counts = [0] * 24
-        for msg in messages:
-            hour = msg['timestamp'].hour
-            hour_counts[hour] += 1
+    def _analyze_active_hours(self, hours: np.ndarray) -> Dict[str, Any]:
+        """分析活跃时间段，hours 为各条消息所在的小时"""
+        hour_counts = np.bincount(hours, minlength=24)
+        total = int(hour_counts.sum())
         
         # 计算最活跃的时段
-        max_hour = hour_counts.index(max(hour_counts))
-        active_hours = [i for i, count in enumerate(hour_counts) if count > sum(hour_counts) / 24]
-        
         return {
-            'most_active_hour': max_hour,
-            'active_hours': active_hours,
-            'morning_activity': sum(hour_counts[6:12]) / sum(hour_counts) if sum(hour_counts) > 0 else 0,
-            'afternoon_activity': sum(hour_counts[12:18]) / sum(hour_counts) if sum(hour_counts) > 0 else 0,
-            'evening_activity': sum(hour_counts[18:24]) / sum(hour_counts) if sum(hour_counts) > 0 else 0,
-            'night_activity': sum(hour_counts[0:6]) / sum(hour_counts) if sum(hour_counts) > 0 else 0
+            'most_active_hour': int(hour_counts.argmax()),
+            'active_hours': np.flatnonzero(hour_counts > total / 24).tolist(),
+            'morning_activity': int(hour_counts[6:12].sum()) / total if total > 0 else 0,
+            'afternoon_activity': int(hour_counts[12:18].sum()) / total if total > 0 else 0,
+            'evening_activity': int(hour_counts[18:24].sum()) / total if total > 0 else 0,
+            'night_activity': int(hour_counts[0:6].sum()) / total if total > 0 else 0
         }
 
     def _analyze_message_style(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
         """分析消息风格"""
-        # 表情符号分析
-        emoji_patterns = {
-            'happy': ['😊', '😄', '😂', '😍', '😘'],
-            'sad': ['😢', '😭', '😔', '😞'],
-            'angry': ['😠', '😡', '😤'],
-            'neutral': ['😐', '🙂', '😶']
+        types = {
+            'text_only': 0,
+            'with_emoji': 0,
+            'with_image': 0,
+            'with_link': 0,
+            'with_voice': 0
         }
+        found_patterns = set()  # 出现过的表情符号与标点符号
+        word_counts = Counter()  # 词频，同时给出总词数与不同词数
         
-        # 标点符号分析
-        punctuation_patterns = {
-            'exclamation': ['!', '！'],
-            'question': ['?', '？'],
-            'ellipsis': ['...', '…'],
-            'period': ['.', '。']
-        }
-        
-        def count_patterns(text, patterns):
-            return {key: sum(1 for p in patterns[key] if p in text) for key in patterns}
-        
-        # 消息类型分析
-        def analyze_message_types(messages):
-            types = {
-                'text_only': 0,
-                'with_emoji': 0,
-                'with_image': 0,
-                'with_link': 0,
-                'with_voice': 0
-            }
+        # 一次遍历同时完成类型统计、符号检测与分词计数
+        for msg in messages:
+            content = msg['content']
+            
+            # 消息类型分析：一次正则扫描找出所有类型标记
+            markers = _MARKER_RE.findall(content)
+            if markers:
+                types[next(t for marker, t in _MARKER_TYPES.items() if marker in markers)] += 1
+            elif _EMOJI_RE.search(content):
+                types['with_emoji'] += 1
+            else:
+                types['text_only'] += 1
             
-            for msg in messages:
-                content = msg['content']
-                if 'http' in content:
-                    types['with_link'] += 1
-                elif '[图片]' in content:
-                    types['with_image'] += 1
-                elif '[语音]' in content:
-                    types['with_voice'] += 1
-                elif any(emoji in content for emoji_list in emoji_patterns.values() for emoji in emoji_list):
-                    types['with_emoji'] += 1
-                else:
-                    types['text_only'] += 1
+            # 表情符号与标点符号分析（统计出现过的种类），不含任何符号字符的消息直接跳过
+            chars = _STYLE_CHARS.intersection(content)
+            if chars:
+                found_patterns |= chars
+                for pattern in _STYLE_MULTI:
+                    if pattern[0] in chars and pattern not in found_patterns and pattern in content:
+                        found_patterns.add(pattern)
             
-            total = sum(types.values())
-            return {k: v/total if total > 0 else 0 for k, v in types.items()}
+            word_counts.update(content.split())
+        
+        total_words = sum(word_counts.values())
         
-        # 分析所有消息
-        all_content = ' '.join(msg['content'] for msg in messages)
+        def count_patterns(patterns):
+            return {key: sum(1 for p in patterns[key] if p in found_patterns) for key in patterns}
         
         return {
-            'emoji_usage': count_patterns(all_content, emoji_patterns),
-            'punctuation_usage': count_patterns(all_content, punctuation_patterns),
-            'message_types': analyze_message_types(messages),
-            'avg_words_per_message': len(all_content.split()) / len(messages) if messages else 0,
-            'unique_words_ratio': len(set(all_content.split())) / len(all_content.split()) if all_content else 0
-        }
\ No newline at end of file
+            'emoji_usage': count_patterns(EMOJI_PATTERNS),
+            'punctuation_usage': count_patterns(PUNCTUATION_PATTERNS),
+            'message_types': {k: v / len(messages) if messages else 0 for k, v in types.items()},
+            'avg_words_per_message': total_words / len(messages) if messages else 0,
+            'unique_words_ratio': len(word_counts) / total_words if total_words else 0
+        }
@@ -1,26 +1,63 @@
 from typing import Dict, List, Tuple
 import re
-import jieba
+import ahocorasick
 import numpy as np
 
+# 简单的情感词典
+POSITIVE_WORDS = {'喜欢', '开心', '好', '棒', '爱', '感谢', '谢谢', '希望', '期待', '加油',
+                  '赞', '优秀', '完美', '快乐', '温暖', '支持', '同意', '可以', '好的'}
+NEGATIVE_WORDS = {'不', '没', '难过', '讨厌', '烦', '累', '怕', '担心', '生气', '失望',
+                  '抱歉', '对不起', '不好', '不行', '不可以', '不要'}
+
+def _build_automaton() -> ahocorasick.Automaton:
+    """构建情感词自动机（正面 +1，负面 -1），直接扫描原文，无需分词"""
+    automaton = ahocorasick.Automaton()
+    for word in POSITIVE_WORDS:
+        automaton.add_word(word, 1)
+    for word in NEGATIVE_WORDS:
+        automaton.add_word(word, -1)
+    automaton.make_automaton()
+    return automaton
+
+# 导入时构建一次，所有实例共享，首次分析无需再加载词典
+_AUTOMATON = _build_automaton()
+
 class SentimentAnalyzer:
     def __init__(self):
-        # 简单的情感词典
-        self.positive_words = set(['喜欢', '开心', '好', '棒', '爱', '感谢', '谢谢', '希望', '期待', '加油',
-                                 '赞', '优秀', '完美', '快乐', '温暖', '支持', '同意', '可以', '好的'])
-        self.negative_words = set(['不', '没', '难过', '讨厌', '烦', '累', '怕', '担心', '生气', '失望',
-                                 '抱歉', '对不起', '不好', '不行', '不可以', '不要'])
+        self.positive_words = POSITIVE_WORDS
+        self.negative_words = NEGATIVE_WORDS
+        self._automaton = _AUTOMATON
+        
+    def _count_polarity(self, message: str) -> Tuple[int, int]:
+        """统计消息中正面、负面情感词的个数"""
+        # 取最长且不重叠的匹配，近似分词后的词语命中（如“不好”不再同时计入“不”和“好”）
+        positive_count = negative_count = 0
+        for _, polarity in self._automaton.iter_long(message):
+            if polarity > 0:
+                positive_count += 1
+            else:
+                negative_count += 1
+        return positive_count, negative_count
+        
+    def analyze_messages(self, messages: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """批量分析消息情感，返回情感得分与情感标签数组"""
+        counts = np.array([self._count_polarity(message) for message in messages], dtype=np.int64).reshape(-1, 2)
+        lengths = np.fromiter(map(len, messages), dtype=np.int64, count=len(messages))
         
+        scores = np.full(len(messages), 0.5)
+        nonempty = lengths > 0
+        scores[nonempty] = np.clip(
+            (counts[nonempty, 0] - counts[nonempty, 1] + lengths[nonempty]) / (lengths[nonempty] * 2), 0, 1
+        )
+        labels = np.select([scores > 0.6, scores < 0.4], ['positive', 'negative'], 'neutral')
+        return scores, labels
+    
     def analyze_message(self, message: str) -> Dict:
         """分析单条消息的情感"""
-        # 分词
-        words = jieba.lcut(message)
-        
-        # 计算情感得分
-        positive_count = sum(1 for word in words if word in self.positive_words)
-        negative_count = sum(1 for word in words if word in self.negative_words)
+        positive_count, negative_count = self._count_polarity(message)
         
-        total_words = len(words)
+        # 以字符数作为归一化的词数
+        total_words = len(message)
         if total_words == 0:
             sentiment_score = 0.5
         else:
@@ -45,19 +82,24 @@ class SentimentAnalyzer:
     
     def analyze_conversation_pair(self, pair: Dict) -> Dict:
         """分析对话对的情感特征"""
-        first_message_analysis = self.analyze_message(pair['first_message'])
-        second_message_analysis = self.analyze_message(pair['second_message'])
+        return self.analyze_conversation_pairs([pair])[0]
+    
+    def analyze_conversation_pairs(self, pairs: List[Dict]) -> List[Dict]:
+        """批量分析对话对的情感特征，所有消息一次性计算情感"""
+        texts = [pair['first_message'] for pair in pairs] + [pair['second_message'] for pair in pairs]
+        _, labels = self.analyze_messages(texts)
+        first_labels, second_labels = labels[:len(pairs)].tolist(), labels[len(pairs):].tolist()
         
-        return {
+        return [{
             'first_sender': pair['first_sender'],
             'second_sender': pair['second_sender'],
-            'first_sentiment': first_message_analysis['sentiment'],
-            'second_sentiment': second_message_analysis['sentiment'],
-            'first_emotion': first_message_analysis['emotion'],
-            'second_emotion': second_message_analysis['emotion'],
+            'first_sentiment': first,
+            'second_sentiment': second,
+            'first_emotion': first,  # 简化版本中情感和情绪相同
+            'second_emotion': second,
             'response_time': pair['response_time'],
             'message_length_ratio': len(pair['second_message']) / len(pair['first_message']) if pair['first_message'] else 1
-        }
+        } for pair, first, second in zip(pairs, first_labels, second_labels)]
     
     def calculate_engagement_score(self, analysis: Dict) -> float:
         """计算对话参与度分数"""
@@ -1,10 +1,12 @@
+import matplotlib as mpl
+mpl.use('Agg')  # 只输出图片文件，使用非交互后端，避免初始化 GUI
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 from typing import Dict, List
 import numpy as np
-import matplotlib as mpl
 import os
+import io
 
 class ChatVisualizer:
     def __init__(self):
@@ -25,103 +27,119 @@ class ChatVisualizer:
         if directory and not os.path.exists(directory):
             os.makedirs(directory)
             
-    def _save_figure(self, save_path: str):
-        """统一的图片保存方法"""
+    def _save_figure(self, fig, save_path: str):
+        """统一的图片保存方法，保存后只关闭当前图"""
         if save_path:
             self._ensure_directory_exists(save_path)
-            plt.savefig(save_path, 
+            fig.savefig(save_path, 
                        format='png',
                        bbox_inches='tight', 
                        dpi=300, 
-                       backend='agg',
                        facecolor='white',
                        edgecolor='none',
                        pad_inches=0.1)
-        plt.close('all')
+        plt.close(fig)
+        
+    def _plot_histogram_by_sender(self, ax, values: pd.Series, senders: pd.Series, bins: int = 50):
+        """按发送者分组绘制直方图，各组共用同一组分箱"""
+        valid = values.notna()
+        values, senders = values[valid].to_numpy(dtype=float), senders[valid]
+        edges = np.histogram_bin_edges(values, bins=bins)
+        for sender, index in senders.groupby(senders).indices.items():
+            counts, _ = np.histogram(values[index], bins=edges)
+            ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.5, label=sender)
+        ax.legend()
         
     def plot_engagement_scores(self, scores: Dict, save_path: str = None):
         """绘制参与度分数"""
-        plt.figure(figsize=(10, 6))
-        plt.bar(['用户', '对方'], [scores['user_score'], scores['partner_score']])
-        plt.title('对话参与度对比')
-        plt.ylabel('参与度分数')
-        plt.ylim(0, 100)
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.bar(['用户', '对方'], [scores['user_score'], scores['partner_score']])
+        ax.set_title('对话参与度对比')
+        ax.set_ylabel('参与度分数')
+        ax.set_ylim(0, 100)
         
-        self._save_figure(save_path)
+        self._save_figure(fig, save_path)
         
     def plot_response_time_distribution(self, df: pd.DataFrame, save_path: str = None):
         """绘制回复时间分布"""
-        plt.figure(figsize=(12, 6))
-        sns.histplot(data=df, x='response_time', hue='sender', bins=50)
-        plt.title('回复时间分布')
-        plt.xlabel('回复时间（秒）')
-        plt.ylabel('频次')
+        fig, ax = plt.subplots(figsize=(12, 6))
+        self._plot_histogram_by_sender(ax, df['response_time'], df['sender'])
+        ax.set_title('回复时间分布')
+        ax.set_xlabel('回复时间（秒）')
+        ax.set_ylabel('频次')
         
-        self._save_figure(save_path)
+        self._save_figure(fig, save_path)
         
     def plot_message_length_distribution(self, df: pd.DataFrame, save_path: str = None):
         """绘制消息长度分布"""
-        plt.figure(figsize=(12, 6))
-        sns.histplot(data=df, x=df['content'].str.len(), hue='sender', bins=50)
-        plt.title('消息长度分布')
-        plt.xlabel('消息长度（字符）')
-        plt.ylabel('频次')
+        fig, ax = plt.subplots(figsize=(12, 6))
+        lengths = df['content_length'] if 'content_length' in df else df['content'].map(len)
+        self._plot_histogram_by_sender(ax, lengths, df['sender'])
+        ax.set_title('消息长度分布')
+        ax.set_xlabel('消息长度（字符）')
+        ax.set_ylabel('频次')
         
-        self._save_figure(save_path)
+        self._save_figure(fig, save_path)
         
     def plot_daily_activity(self, daily_messages: Dict, save_path: str = None):
         """绘制每日活动趋势"""
         df = pd.DataFrame(daily_messages)
-        plt.figure(figsize=(15, 6))
-        df.plot(kind='line')
-        plt.title('每日消息数量趋势')
-        plt.xlabel('日期')
-        plt.ylabel('消息数量')
-        plt.xticks(rotation=45)
+        fig, ax = plt.subplots(figsize=(15, 6))
+        df.plot(kind='line', ax=ax)
+        ax.set_title('每日消息数量趋势')
+        ax.set_xlabel('日期')
+        ax.set_ylabel('消息数量')
+        ax.tick_params(axis='x', labelrotation=45)
         
-        self._save_figure(save_path)
+        self._save_figure(fig, save_path)
         
     def plot_hourly_activity(self, hourly_messages: Dict, save_path: str = None):
         """绘制小时活动分布"""
         df = pd.DataFrame(hourly_messages)
-        plt.figure(figsize=(12, 6))
-        df.plot(kind='bar')
-        plt.title('小时消息分布')
-        plt.xlabel('小时')
-        plt.ylabel('消息数量')
+        fig, ax = plt.subplots(figsize=(12, 6))
+        df.plot(kind='bar', ax=ax)
+        ax.set_title('小时消息分布')
+        ax.set_xlabel('小时')
+        ax.set_ylabel('消息数量')
         
-        self._save_figure(save_path)
+        self._save_figure(fig, save_path)
         
     def generate_summary_report(self, analysis_results: Dict, save_path: str = None):
         """生成总结报告"""
-        report = []
-        report.append("聊天记录分析报告")
-        report.append("=" * 50)
+        # 逐行写入缓冲区，避免先收集列表再整体拼接
+        buffer = io.StringIO()
+        
+        def write(line: str):
+            buffer.write(line)
+            buffer.write('\n')
+        
+        write("聊天记录分析报告")
+        write("=" * 50)
         
         # 参与度分析
-        report.append("\n1. 参与度分析")
-        report.append(f"用户平均回复时间: {analysis_results['response_patterns']['user_avg_response_time']:.2f}秒")
-        report.append(f"对方平均回复时间: {analysis_results['response_patterns']['partner_avg_response_time']:.2f}秒")
+        write("\n1. 参与度分析")
+        write(f"用户平均回复时间: {analysis_results['response_patterns']['user_avg_response_time']:.2f}秒")
+        write(f"对方平均回复时间: {analysis_results['response_patterns']['partner_avg_response_time']:.2f}秒")
         
         # 话题发起分析
-        report.append("\n2. 话题发起分析")
-        report.append(f"用户发起话题次数: {analysis_results['topic_initiation']['user']}")
-        report.append(f"对方发起话题次数: {analysis_results['topic_initiation']['partner']}")
+        write("\n2. 话题发起分析")
+        write(f"用户发起话题次数: {analysis_results['topic_initiation']['user']}")
+        write(f"对方发起话题次数: {analysis_results['topic_initiation']['partner']}")
         
         # 关键讨论
-        report.append("\n3. 关键讨论分析")
+        write("\n3. 关键讨论分析")
         for i, discussion in enumerate(analysis_results['key_discussions'], 1):
-            report.append(f"\n关键讨论 {i}:")
-            report.append(f"主题: {discussion['analysis']['topic']}")
-            report.append(f"重要性: {discussion['analysis']['importance']}/10")
-            report.append(f"对话深度: {discussion['analysis']['depth']}/10")
-            report.append(f"双方态度: {discussion['analysis']['attitudes']}")
-            report.append("\n对话内容:")
+            write(f"\n关键讨论 {i}:")
+            write(f"主题: {discussion['analysis']['topic']}")
+            write(f"重要性: {discussion['analysis']['importance']}/10")
+            write(f"对话深度: {discussion['analysis']['depth']}/10")
+            write(f"双方态度: {discussion['analysis']['attitudes']}")
+            write("\n对话内容:")
             for msg in discussion['messages']:
-                report.append(f"{msg['timestamp']} - {msg['sender']}: {msg['content'][:100]}...")
+                write(f"{msg['timestamp']} - {msg['sender']}: {msg['content'][:100]}...")
         
         # 话题分析
-        report.append("\n4. 话题分析")
+        write("\n4. 话题分析")
         topics = {}
         for group in analysis_results['conversation_analysis']['analyzed_groups']:
             topic = group['analysis']['topic']
@@ -129,12 +147,13 @@ class ChatVisualizer:
                 topics[topic] = 0
             topics[topic] += 1
             
-        report.append("\n主要话题统计:")
+        write("\n主要话题统计:")
         for topic, count in sorted(topics.items(), key=lambda x: x[1], reverse=True):
-            report.append(f"{topic}: {count}次讨论")
+            write(f"{topic}: {count}次讨论")
         
+        report = buffer.getvalue()[:-1]  # 去掉最后一行之后的换行
         if save_path:
             with open(save_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(report))
+                f.write(report)
                 
-        return '\n'.join(report) 
\ No newline at end of file
+        return report 
\ No newline at end of file
@@ -7,6 +7,15 @@ from chat_analyzer.key_moments_analyzer import KeyMomentsAnalyzer
 import json
 import argparse
 
+def groups_to_messages(analyzed_groups, user_name: str):
+    """将 analyzed_groups 展开为 KeyMomentsAnalyzer 使用的消息列表"""
+    return [{
+        'timestamp': msg['timestamp'],
+        'content': msg['content'],
+        'sender': msg['sender'],
+        'is_user': msg['sender'] == user_name
+    } for group in analyzed_groups for msg in group['messages']]
+
 def analyze_chat(file_path: str, user_name: str, output_dir: str = "analysis_results"):
     """分析聊天记录的主函数"""
     # 创建输出目录
@@ -37,25 +46,21 @@ def analyze_chat(file_path: str, user_name: str, output_dir: str = "analysis_res
     # 分析关键时间节点和标志性话题
     print("分析关键时间节点和标志性话题...")
     # 将 analyzed_groups 转换为正确的消息格式
-    messages = []
-    for group in conversation_analysis['analyzed_groups']:
-        for msg in group['messages']:
-            messages.append({
-                'timestamp': msg['timestamp'],
-                'content': msg['content'],
-                'sender': msg['sender'],
-                'is_user': msg['sender'] == user_name
-            })
+    messages = groups_to_messages(conversation_analysis['analyzed_groups'], user_name)
     key_moments_analyzer.extract_landmark_topics(messages)
     key_moments_analyzer.save_results(output_dir)
     
     # 生成可视化
     print("正在生成可视化结果...")
+    # 一次遍历按话题发起方累加对话深度
+    user_score = partner_score = 0
+    for g in conversation_analysis['analyzed_groups']:
+        if g['messages'][0]['sender'] == user_name:
+            user_score += g['analysis']['depth']
+        else:
+            partner_score += g['analysis']['depth']
     visualizer.plot_engagement_scores(
-        {'user_score': sum(g['analysis']['depth'] for g in conversation_analysis['analyzed_groups'] 
-                          if g['messages'][0]['sender'] == user_name),
-         'partner_score': sum(g['analysis']['depth'] for g in conversation_analysis['analyzed_groups'] 
-                            if g['messages'][0]['sender'] != user_name)},
+        {'user_score': user_score, 'partner_score': partner_score},
         os.path.join(output_dir, 'engagement_scores.png')
     )
     
@@ -92,25 +97,7 @@ def analyze_chat(file_path: str, user_name: str, output_dir: str = "analysis_res
     print("\n分析完成！结果已保存到", output_dir)
     return report
 
-def process_chat_records(file_path):
-    """处理本地聊天记录文件"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content
-    except Exception as e:
-        print(f"读取文件时发生错误: {e}")
-        return None
-
 def main():
-    # 从本地文件读取聊天记录
-    file_path = input("请输入聊天记录文件的路径: ")
-    chat_content = process_chat_records(file_path)
-    
-    if chat_content is None:
-        print("无法读取聊天记录文件")
-        return
-        
     parser = argparse.ArgumentParser(description='分析微信聊天记录')
     parser.add_argument('chat_file', help='聊天记录文件路径')
     parser.add_argument('partner_name', help='对话伙伴的微信昵称')
@@ -118,6 +105,11 @@ def main():
     parser.add_argument('--key-dates', help='关键时间节点配置文件路径')
     args = parser.parse_args()
 
+    # 只检查文件是否存在，内容由 ChatDataProcessor 读取
+    if not os.path.exists(args.chat_file):
+        print("无法读取聊天记录文件")
+        return
+
     # 创建输出目录
     os.makedirs(args.output_dir, exist_ok=True)
 
@@ -189,15 +181,7 @@ def main():
     # 分析关键时间节点和标志性话题
     print("分析关键时间节点和标志性话题...")
     # 将 analyzed_groups 转换为正确的消息格式
-    messages = []
-    for group in conversation_analysis['analyzed_groups']:
-        for msg in group['messages']:
-            messages.append({
-                'timestamp': msg['timestamp'],
-                'content': msg['content'],
-                'sender': msg['sender'],
-                'is_user': msg['sender'] == args.partner_name
-            })
+    messages = groups_to_messages(conversation_analysis['analyzed_groups'], args.partner_name)
     key_moments_analyzer.extract_landmark_topics(messages)
     key_moments_analyzer.save_results(args.output_dir)
 